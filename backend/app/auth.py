@@ -1,17 +1,38 @@
 from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import base64
+import hashlib
+import hmac
+import threading
+import time
 import os
 
+# Стоимость Argon2: время (число проходов), память (КиБ) и число потоков.
+# Старые хеши с другими параметрами продолжают проверяться
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 102400))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 8))
+
 # Настройки для хеширования паролей и JWT
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM
+)
 
 # Берем секреты из переменных окружения
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+# Заголовок, в котором возвращается новый токен после изменения данных пользователя
+ACCESS_TOKEN_HEADER = "X-Access-Token"
+
 def verify_password(plain_password, hashed_password):
     """Проверяет пароль"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -42,6 +63,68 @@ def verify_token(token: str):
         if email is None:
             return None
 
-        return {"email": email, "role": role}
+        return {
+            "email": email,
+            "role": role,
+            "user_id": payload.get("uid"),
+            "allergen_ids": payload.get("allergens", []),
+            "token_version": payload.get("ver", 0)
+        }
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+def _receive_signature(order_id: int) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), f"receive:{order_id}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode()
+
+def create_receive_token(order_id: int) -> str:
+    """Короткий подписанный токен заказа для QR-кода на линии раздачи"""
+    return f"{order_id}.{_receive_signature(order_id)}"
+
+def parse_receive_token(token: str) -> Optional[int]:
+    """Возвращает id заказа из токена или None, если подпись неверна"""
+    order_id, _, signature = token.partition(".")
+    if not order_id.isdigit() or not hmac.compare_digest(signature, _receive_signature(int(order_id))):
+        return None
+    return int(order_id)
+
+def create_user_token(user) -> str:
+    """Создает JWT с данными пользователя, достаточными для авторизации без БД"""
+    return create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role.value,
+        "allergens": sorted(allergen.id for allergen in user.allergens_rel or []),
+        "ver": user.token_version or 0
+    })
+
+# Состояние пользователя (версия токена, активность) для проверки токена
+# без загрузки пользователя. Запись живет TOKEN_STATE_TTL_SECONDS, затем
+# перечитывается из БД: так смена пароля или деактивация в другом воркере
+# начинает действовать не позже этого срока. Хранится не больше
+# TOKEN_STATE_CACHE_SIZE последних пользователей, самые давние вытесняются
+TOKEN_STATE_TTL_SECONDS = float(os.getenv("TOKEN_STATE_TTL_SECONDS", 5))
+TOKEN_STATE_CACHE_SIZE = int(os.getenv("TOKEN_STATE_CACHE_SIZE", 10000))
+
+_token_states: OrderedDict[int, tuple[int, bool, float]] = OrderedDict()
+_token_states_lock = threading.Lock()
+
+def remember_token_state(user_id: int, version: int, is_active: bool):
+    """Запоминает актуальную версию токена и активность пользователя"""
+    with _token_states_lock:
+        _token_states[user_id] = (version, is_active, time.monotonic())
+        _token_states.move_to_end(user_id)
+        while len(_token_states) > TOKEN_STATE_CACHE_SIZE:
+            _token_states.popitem(last=False)
+
+def cached_token_state(user_id: int) -> Optional[tuple[int, bool]]:
+    """Версия токена и активность из кэша или None, если запись устарела"""
+    with _token_states_lock:
+        entry = _token_states.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] >= TOKEN_STATE_TTL_SECONDS:
+            del _token_states[user_id]
+            return None
+        _token_states.move_to_end(user_id)
+    return entry[0], entry[1]
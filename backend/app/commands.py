@@ -0,0 +1,108 @@
+"""Служебные команды обслуживания БД.
+
+Запуск: python -m app.commands <команда>
+"""
+import argparse
+from datetime import date, timedelta
+
+from . import crud
+from .database import SessionLocal, engine
+from .migrations import run_migrations
+from .school_time import school_today
+
+
+def migrate(args):
+    """Создать таблицы и применить миграции схемы БД"""
+    applied = run_migrations(engine)
+    print(f"Схема БД актуальна, применено миграций: {applied}")
+
+
+def rebuild_stats(args):
+    """Пересчитать сводную таблицу daily_order_stats по всем заказам"""
+    db = SessionLocal()
+    try:
+        rows = crud.rebuild_daily_order_stats(db)
+    finally:
+        db.close()
+    print(f"Сводная статистика пересчитана: {rows} строк")
+
+
+def materialize_subscriptions(args):
+    """Создать заказы по абонементам на день (по умолчанию - на завтра)"""
+    service_day = args.date or school_today() + timedelta(days=1)
+    db = SessionLocal()
+    try:
+        created = crud.materialize_subscription_orders(db, service_day)
+    finally:
+        db.close()
+    print(f"Заказы по абонементам на {service_day.isoformat()}: создано {created}")
+
+
+def snapshot_balances(args):
+    """Сдвинуть снимки балансов на конец журнала balance_ledger"""
+    db = SessionLocal()
+    try:
+        rows = crud.take_balance_snapshots(db)
+    finally:
+        db.close()
+    print(f"Снимки балансов обновлены: {rows} пользователей")
+
+
+def reconcile_balances(args):
+    """Сверить балансы пользователей с журналом balance_ledger"""
+    db = SessionLocal()
+    try:
+        report = crud.reconcile_balances(db)
+    finally:
+        db.close()
+    print(
+        f"Проверено пользователей: {report['users_checked']}, "
+        f"сумма балансов {report['total_balance']:.2f}, по журналу {report['total_ledger_balance']:.2f}"
+    )
+    for mismatch in report["mismatches"]:
+        print(
+            f"  пользователь {mismatch['student_id']}: баланс {mismatch['balance']:.2f}, "
+            f"по журналу {mismatch['ledger_balance']:.2f}"
+        )
+    if report["mismatches"]:
+        raise SystemExit(1)
+
+
+def repair_ratings(args):
+    """Пересчитать агрегаты оценок блюд по таблице отзывов"""
+    db = SessionLocal()
+    try:
+        rows = crud.rebuild_dish_ratings(db)
+    finally:
+        db.close()
+    print(f"Оценки пересчитаны: {rows} блюд с отзывами")
+
+
+# Команда -> (обработчик, аргументы для argparse)
+COMMANDS = {
+    "migrate": (migrate, []),
+    "rebuild-stats": (rebuild_stats, []),
+    "materialize-subscriptions": (materialize_subscriptions, [
+        ("--date", {"type": date.fromisoformat, "help": "День обслуживания в формате YYYY-MM-DD"}),
+    ]),
+    "snapshot-balances": (snapshot_balances, []),
+    "reconcile-balances": (reconcile_balances, []),
+    "repair-ratings": (repair_ratings, []),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.commands", description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (handler, arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=handler.__doc__)
+        for flag, options in arguments:
+            subparser.add_argument(flag, **options)
+
+    args = parser.parse_args(argv)
+    handler, _ = COMMANDS[args.command]
+    handler(args)
+
+
+if __name__ == "__main__":
+    main()
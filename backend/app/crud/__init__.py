@@ -6,7 +6,9 @@ from .user_crud import (
     update_user_profile,
     update_user_balance,
     update_user_personal_info,
-    update_user_password
+    update_user_password,
+    update_user_active,
+    get_user_token_state
 )
 
 from .dish_crud import (
@@ -19,12 +21,25 @@ from .dish_crud import (
 
 from .order_crud import (
     create_order,
+    create_cart_orders,
     get_user_orders,
     get_all_orders,
     get_all_orders_with_student,
     mark_order_received,
+    mark_orders_received,
     get_today_orders,
-    get_today_orders_with_student
+    get_today_orders_with_student,
+    payment_report_query
+)
+
+from .ledger_crud import (
+    take_balance_snapshots,
+    reconcile_balances
+)
+
+from .subscription_crud import (
+    materialize_subscription_orders,
+    get_upcoming_subscription_orders
 )
 
 from .purchase_request_crud import (
@@ -36,18 +51,23 @@ from .purchase_request_crud import (
 from .review_crud import (
     create_review,
     get_dish_reviews,
-    get_user_reviews
+    get_user_reviews,
+    rebuild_dish_ratings
 )
 
 from .stats_crud import (
     get_payment_statistics,
-    get_attendance_statistics
+    get_attendance_statistics,
+    rebuild_daily_order_stats,
+    get_production_plan,
+    count_pending_requests
 )
 
 from .allergen_crud import (
     get_allergen_by_id,
     get_allergen_by_name,
     get_all_allergens,
+    get_allergens_version,
     create_allergen,
     get_allergens_by_ids
 )
@@ -58,6 +78,7 @@ from .balance_topup_crud import (
     get_all_topup_requests,
     get_topup_request_by_id,
     update_topup_request_status,
+    batch_update_topup_requests,
     get_pending_topup_requests_count
 )
 
@@ -70,6 +91,8 @@ __all__ = [
     "update_user_balance",
     "update_user_personal_info",
     "update_user_password",
+    "update_user_active",
+    "get_user_token_state",
 
     # Dish CRUD functions
     "get_dishes",
@@ -80,12 +103,19 @@ __all__ = [
 
     # Order CRUD functions
     "create_order",
+    "create_cart_orders",
     "get_user_orders",
     "get_all_orders",
     "get_all_orders_with_student",
     "mark_order_received",
+    "mark_orders_received",
     "get_today_orders",
     "get_today_orders_with_student",
+    "payment_report_query",
+    "take_balance_snapshots",
+    "reconcile_balances",
+    "materialize_subscription_orders",
+    "get_upcoming_subscription_orders",
 
     # Purchase request CRUD functions
     "create_purchase_request",
@@ -96,15 +126,20 @@ __all__ = [
     "create_review",
     "get_dish_reviews",
     "get_user_reviews",
+    "rebuild_dish_ratings",
 
     # Statistics CRUD functions
     "get_payment_statistics",
     "get_attendance_statistics",
+    "rebuild_daily_order_stats",
+    "get_production_plan",
+    "count_pending_requests",
 
     # Allergen CRUD functions
     "get_allergen_by_id",
     "get_allergen_by_name",
     "get_all_allergens",
+    "get_allergens_version",
     "create_allergen",
     "get_allergens_by_ids",
 
@@ -114,5 +149,6 @@ __all__ = [
     "get_all_topup_requests",
     "get_topup_request_by_id",
     "update_topup_request_status",
+    "batch_update_topup_requests",
     "get_pending_topup_requests_count"
 ]
\ No newline at end of file
@@ -1,6 +1,13 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from .. import models, schemas
-from typing import List, Optional
+from typing import Iterable, List, Optional
+
+# Аллерген с id N занимает бит N-1. В знаковый BIGINT помещаются id 1..62,
+# а бит 62 отмечает, что есть аллергены за пределами маски: тогда
+# проверка пересечения выполняется по связям, а не по маске
+MASK_MAX_ALLERGEN_ID = 62
+MASK_OVERFLOW_BIT = 1 << 62
 
 
 def get_allergen_by_id(db: Session, allergen_id: int):
@@ -18,6 +25,12 @@ def get_all_allergens(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Allergen).offset(skip).limit(limit).all()
 
 
+def get_allergens_version(db: Session) -> str:
+    """Версия справочника аллергенов для ETag (аллергены только добавляются)"""
+    count, max_id = db.query(func.count(models.Allergen.id), func.max(models.Allergen.id)).one()
+    return f"{count}:{max_id or 0}"
+
+
 def create_allergen(db: Session, allergen: schemas.AllergenCreate):
     """Создать новый аллерген"""
     db_allergen = models.Allergen(**allergen.model_dump())
@@ -32,3 +45,24 @@ def get_allergens_by_ids(db: Session, allergen_ids: List[int]) -> List[models.Al
     if not allergen_ids:
         return []
     return db.query(models.Allergen).filter(models.Allergen.id.in_(allergen_ids)).all()
+
+
+def allergen_mask(allergen_ids: Iterable[int]) -> int:
+    """Битовая маска для набора аллергенов"""
+    mask = 0
+    for allergen_id in allergen_ids:
+        if 1 <= allergen_id <= MASK_MAX_ALLERGEN_ID:
+            mask |= 1 << (allergen_id - 1)
+        else:
+            mask |= MASK_OVERFLOW_BIT
+    return mask
+
+
+def masks_conflict(first_mask: int, second_mask: int) -> Optional[bool]:
+    """Пересекаются ли наборы аллергенов; None, если по маскам не определить"""
+    exact_bits = ~MASK_OVERFLOW_BIT
+    if first_mask & second_mask & exact_bits:
+        return True
+    if first_mask & second_mask & MASK_OVERFLOW_BIT:
+        return None
+    return False
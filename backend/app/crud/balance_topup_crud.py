@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session, joinedload
-from .. import models, schemas
+from sqlalchemy import Float, Integer, column, func, select, update, values
+from .. import models, schemas, pagination
+from . import ledger_crud
+from ..pending_counts import pending_counts, BALANCE_TOPUP_REQUESTS
 from typing import List, Optional
+from collections import defaultdict
 
 
 def create_topup_request(db: Session, student_id: int, amount: float):
@@ -12,6 +16,7 @@ def create_topup_request(db: Session, student_id: int, amount: float):
     )
     db.add(db_request)
     db.commit()
+    pending_counts.adjust(BALANCE_TOPUP_REQUESTS, 1)
     db.refresh(db_request)
     return db_request
 
@@ -21,7 +26,8 @@ def get_student_topup_requests(
     student_id: int,
     skip: int = 0,
     limit: int = 100,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    after=None
 ) -> List[models.BalanceTopupRequest]:
     """Получение заявок на пополнение баланса студента"""
     query = db.query(models.BalanceTopupRequest).filter(
@@ -31,16 +37,15 @@ def get_student_topup_requests(
     if status:
         query = query.filter(models.BalanceTopupRequest.status == status)
     
-    return query.order_by(
-        models.BalanceTopupRequest.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    return pagination.keyset_page(query, models.BalanceTopupRequest, skip, limit, after)
 
 
 def get_all_topup_requests(
     db: Session,
     skip: int = 0,
     limit: int = 100,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    after=None
 ) -> List[models.BalanceTopupRequest]:
     """Получение всех заявок на пополнение баланса (для админа)"""
     query = db.query(models.BalanceTopupRequest).options(
@@ -50,9 +55,7 @@ def get_all_topup_requests(
     if status:
         query = query.filter(models.BalanceTopupRequest.status == status)
     
-    return query.order_by(
-        models.BalanceTopupRequest.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    return pagination.keyset_page(query, models.BalanceTopupRequest, skip, limit, after)
 
 
 def get_topup_request_by_id(db: Session, request_id: int) -> Optional[models.BalanceTopupRequest]:
@@ -69,28 +72,99 @@ def update_topup_request_status(
     admin_comment: Optional[str] = None
 ) -> Optional[models.BalanceTopupRequest]:
     """Обновление статуса заявки на пополнение баланса"""
+    # FOR UPDATE: второе одновременное одобрение ждет commit первого и
+    # видит уже approved, поэтому сумма не зачисляется дважды
     db_request = db.query(models.BalanceTopupRequest).filter(
         models.BalanceTopupRequest.id == request_id
-    ).first()
+    ).with_for_update().first()
     
     if not db_request:
         return None
     
+    # Зачисляем только при переходе в approved, повторное одобрение не удваивает сумму
+    credit = status == "approved" and db_request.status != "approved"
+    delta = (status == "pending") - (db_request.status == "pending")
+
     db_request.status = status
     if admin_comment is not None:
         db_request.admin_comment = admin_comment
     
     # If approved, update user balance
-    if status == "approved":
-        user = db.query(models.User).filter(models.User.id == db_request.student_id).first()
-        if user:
-            user.balance += db_request.amount
+    if credit:
+        db.execute(
+            update(models.User)
+            .where(models.User.id == db_request.student_id)
+            .values(balance=models.User.balance + db_request.amount)
+        )
+        ledger_crud.record_entries(db, [{
+            "student_id": db_request.student_id,
+            "amount": db_request.amount,
+            "kind": "topup",
+            "topup_request_id": db_request.id
+        }])
     
     db.commit()
+    pending_counts.adjust(BALANCE_TOPUP_REQUESTS, delta)
     db.refresh(db_request)
     return db_request
 
 
+def batch_update_topup_requests(
+    db: Session,
+    status: str,
+    ids: Optional[List[int]] = None,
+    max_amount: Optional[float] = None,
+    parallel: Optional[str] = None,
+    admin_comment: Optional[str] = None
+) -> dict:
+    """Одобрить или отклонить ожидающие заявки одним UPDATE и зачислить суммы по ученикам"""
+    topup = models.BalanceTopupRequest
+    statement = update(topup).where(topup.status == "pending")
+    if ids is not None:
+        statement = statement.where(topup.id.in_(ids))
+    if max_amount is not None:
+        statement = statement.where(topup.amount <= max_amount)
+    if parallel is not None:
+        statement = statement.where(topup.student_id.in_(
+            select(models.User.id).where(models.User.parallel == parallel)
+        ))
+
+    new_values = {"status": status, "updated_at": func.now()}
+    if admin_comment is not None:
+        new_values["admin_comment"] = admin_comment
+    updated = db.execute(
+        statement.values(**new_values).returning(topup.id, topup.student_id, topup.amount)
+    ).all()
+
+    credits = defaultdict(float)
+    if status == "approved":
+        for row in updated:
+            credits[row.student_id] += row.amount
+
+    if credits:
+        credit_values = values(
+            column("student_id", Integer), column("amount", Float), name="credits"
+        ).data(list(credits.items()))
+        db.execute(
+            update(models.User)
+            .where(models.User.id == credit_values.c.student_id)
+            .values(balance=models.User.balance + credit_values.c.amount)
+        )
+        ledger_crud.record_entries(db, [
+            {"student_id": row.student_id, "amount": row.amount, "kind": "topup", "topup_request_id": row.id}
+            for row in updated
+        ])
+
+    db.commit()
+    pending_counts.adjust(BALANCE_TOPUP_REQUESTS, -len(updated))
+    return {
+        "status": status,
+        "updated_ids": sorted(row.id for row in updated),
+        "students_credited": len(credits),
+        "total_amount": sum(credits.values())
+    }
+
+
 def get_pending_topup_requests_count(db: Session) -> int:
     """Получение количества ожидающих заявок"""
     return db.query(models.BalanceTopupRequest).filter(
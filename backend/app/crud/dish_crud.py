@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
 from .. import models, schemas
 from . import allergen_crud
+from ..menu_cache import menu_cache
 from typing import List, Optional
 
 
@@ -14,11 +14,15 @@ def get_dishes(db: Session, skip: int = 0, limit: int = 100, meal_type: Optional
 
     # Filter out dishes that contain any of the excluded allergens
     if exclude_allergen_ids:
-        # Subquery to find dishes with excluded allergens
-        excluded_dish_ids = db.query(models.dish_allergen_association.c.dish_id).filter(
-            models.dish_allergen_association.c.allergen_id.in_(exclude_allergen_ids)
-        ).distinct()
-        query = query.filter(~models.Dish.id.in_(excluded_dish_ids))
+        exclude_mask = allergen_crud.allergen_mask(exclude_allergen_ids)
+        if not exclude_mask & allergen_crud.MASK_OVERFLOW_BIT:
+            query = query.filter(models.Dish.allergen_mask.op("&")(exclude_mask) == 0)
+        else:
+            # Subquery to find dishes with excluded allergens
+            excluded_dish_ids = db.query(models.dish_allergen_association.c.dish_id).filter(
+                models.dish_allergen_association.c.allergen_id.in_(exclude_allergen_ids)
+            ).distinct()
+            query = query.filter(~models.Dish.id.in_(excluded_dish_ids))
 
     return query.offset(skip).limit(limit).all()
 
@@ -36,6 +40,7 @@ def create_dish(db: Session, dish: schemas.DishCreate):
     if dish.allergen_ids:
         allergens = allergen_crud.get_allergens_by_ids(db, dish.allergen_ids)
         db_dish.allergens_rel = allergens
+        db_dish.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in allergens)
 
     # Handle meal types
     if dish.meal_type_ids:
@@ -44,6 +49,7 @@ def create_dish(db: Session, dish: schemas.DishCreate):
 
     db.add(db_dish)
     db.commit()
+    menu_cache.invalidate()
     db.refresh(db_dish)
     return db_dish
 
@@ -66,6 +72,7 @@ def update_dish(db: Session, dish_id: int, dish_update: schemas.DishUpdate):
             db_dish.allergens_rel = allergens
         else:
             db_dish.allergens_rel = []
+        db_dish.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in db_dish.allergens_rel)
 
     # Handle meal types update
     if 'meal_type_ids' in dish_update.model_dump(exclude_unset=True):
@@ -77,6 +84,7 @@ def update_dish(db: Session, dish_id: int, dish_update: schemas.DishUpdate):
             db_dish.meal_types = []
 
     db.commit()
+    menu_cache.invalidate()
     db.refresh(db_dish)
     return db_dish
 
@@ -86,4 +94,5 @@ def delete_dish(db: Session, dish_id: int):
     if dish:
         db.delete(dish)
         db.commit()
+        menu_cache.invalidate()
     return dish
\ No newline at end of file
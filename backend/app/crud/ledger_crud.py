@@ -0,0 +1,121 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .. import models
+from typing import List
+from datetime import timedelta
+import os
+
+# Расхождение меньше копейки считаем погрешностью float
+RECONCILE_TOLERANCE = 0.005
+# Записи журнала моложе этого возраста не попадают в снимок (см. take_balance_snapshots)
+BALANCE_SNAPSHOT_LAG_SECONDS = int(os.getenv("BALANCE_SNAPSHOT_LAG_SECONDS", 60))
+
+
+def record_entries(db: Session, entries: List[dict]):
+    """Добавить записи в журнал (в текущей транзакции, без commit)"""
+    if entries:
+        db.execute(insert(models.BalanceLedgerEntry), entries)
+
+
+def record_opening_balances(db: Session) -> int:
+    """Открывающие записи для пользователей с ненулевым балансом и пустым журналом"""
+    has_entries = select(models.BalanceLedgerEntry.id).where(
+        models.BalanceLedgerEntry.student_id == models.User.id
+    ).exists()
+    result = db.execute(
+        insert(models.BalanceLedgerEntry).from_select(
+            ["student_id", "amount", "kind"],
+            select(models.User.id, models.User.balance, literal("opening"))
+            .where(models.User.balance != 0, ~has_entries)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _ledger_balances():
+    """Баланс по журналу: снимок + записи после него, по каждому пользователю"""
+    ledger = models.BalanceLedgerEntry
+    snapshot = models.BalanceSnapshot
+    return (
+        select(
+            models.User.id.label("student_id"),
+            models.User.balance.label("balance"),
+            (func.coalesce(snapshot.balance, 0.0) + func.coalesce(func.sum(ledger.amount), 0.0)).label("ledger_balance")
+        )
+        .select_from(models.User)
+        .outerjoin(snapshot, snapshot.student_id == models.User.id)
+        .outerjoin(ledger, and_(
+            ledger.student_id == models.User.id,
+            ledger.id > func.coalesce(snapshot.ledger_entry_id, 0)
+        ))
+        .group_by(models.User.id, models.User.balance, snapshot.balance)
+    )
+
+
+def take_balance_snapshots(db: Session) -> int:
+    """Сдвинуть снимки балансов вперед по журналу одним запросом"""
+    ledger = models.BalanceLedgerEntry
+    snapshot = models.BalanceSnapshot
+    # Весь снимок читается в одной транзакции REPEATABLE READ, не блокируя
+    # запись в журнал. Зависимости запроса уже открыли транзакцию в этой
+    # сессии, поэтому уровень изоляции задается для новой
+    db.commit()
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    # id берутся из последовательности до commit, поэтому запись с меньшим
+    # id может стать видимой позже записи с большим. Граница снимка - записи
+    # старше BALANCE_SNAPSHOT_LAG_SECONDS: транзакции журнала короткие, и к
+    # этому времени все записи ниже границы уже закоммичены. Остальные
+    # попадут в следующий снимок
+    bound = (
+        select(func.max(ledger.id))
+        .where(ledger.created_at < func.now() - timedelta(seconds=BALANCE_SNAPSHOT_LAG_SECONDS))
+        .scalar_subquery()
+    )
+    recent = (
+        select(
+            ledger.student_id,
+            func.max(ledger.id),
+            func.coalesce(snapshot.balance, 0.0) + func.sum(ledger.amount),
+            func.now()
+        )
+        .select_from(ledger)
+        .outerjoin(snapshot, snapshot.student_id == ledger.student_id)
+        .where(ledger.id > func.coalesce(snapshot.ledger_entry_id, 0), ledger.id <= bound)
+        .group_by(ledger.student_id, snapshot.balance)
+    )
+    statement = pg_insert(snapshot).from_select(
+        ["student_id", "ledger_entry_id", "balance", "created_at"], recent
+    )
+    result = db.execute(statement.on_conflict_do_update(
+        index_elements=[snapshot.student_id],
+        set_={
+            "ledger_entry_id": statement.excluded.ledger_entry_id,
+            "balance": statement.excluded.balance,
+            "created_at": statement.excluded.created_at
+        }
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def reconcile_balances(db: Session) -> dict:
+    """Сверить users.balance с журналом одним агрегирующим запросом"""
+    rows = db.execute(_ledger_balances()).all()
+    mismatches = [
+        {
+            "student_id": row.student_id,
+            "balance": row.balance,
+            "ledger_balance": row.ledger_balance,
+            "difference": row.balance - row.ledger_balance
+        }
+        for row in rows
+        if abs(row.balance - row.ledger_balance) > RECONCILE_TOLERANCE
+    ]
+    return {
+        "users_checked": len(rows),
+        "total_balance": sum(row.balance for row in rows),
+        "total_ledger_balance": sum(row.ledger_balance for row in rows),
+        "mismatches": mismatches
+    }
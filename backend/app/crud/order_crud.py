@@ -1,114 +1,243 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import Integer, any_, bindparam, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import joinedload
-from .. import models, schemas
-from . import dish_crud
+from .. import models, schemas, pagination, order_events
+from . import allergen_crud, ledger_crud, stats_crud, subscription_crud
+from ..school_time import school_now, school_today, service_date_for
+from ..menu_cache import menu_cache
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+
+
+def _first_order_date(order: schemas.OrderCreate) -> Optional[datetime]:
+    """Дата заказа; абонемент без даты начинается с того же дня недели на следующей неделе"""
+    if order.payment_type == "subscription" and not order.order_date:
+        return school_now() + timedelta(weeks=1)
+    return order.order_date
+
+
+def _allergens_overlap(db: Session, dish_id: int, student_id: int) -> bool:
+    """Точная проверка пересечения аллергенов, когда масок недостаточно"""
+    dish_allergens = models.dish_allergen_association
+    user_allergens = models.user_allergen_association
+    return db.query(
+        select(dish_allergens.c.allergen_id)
+        .join(user_allergens, user_allergens.c.allergen_id == dish_allergens.c.allergen_id)
+        .where(dish_allergens.c.dish_id == dish_id, user_allergens.c.user_id == student_id)
+        .exists()
+    ).scalar()
 
 
 def create_order(db: Session, order: schemas.OrderCreate, student_id: int):
-    """Создать заказ"""
-    # Проверяем наличие блюда
-    dish = dish_crud.get_dish_by_id(db, order.dish_id)
-    if not dish:
+    """Создать заказ (или абонемент с первым заказом) одной транзакцией.
+
+    Абонемент оплачивается и резервирует остаток сразу за все недели,
+    но в orders попадает только первый заказ; остальные создает
+    subscription_crud.materialize_subscription_orders. Возвращает
+    созданный заказ.
+
+    Остаток и баланс уменьшаются условными UPDATE, поэтому параллельные
+    заказы не уводят их в минус: проигравший запрос просто не найдет строку.
+    """
+    order_date = _first_order_date(order)
+    service_date = service_date_for(order_date)
+    num_orders = 1
+    if order.payment_type == "subscription":
+        num_orders = order.subscription_weeks or 1
+
+    # Списываем остаток блюда, только если его хватает на все заказы
+    dish_row = db.execute(
+        update(models.Dish)
+        .where(models.Dish.id == order.dish_id, models.Dish.stock_quantity >= num_orders)
+        .values(stock_quantity=models.Dish.stock_quantity - num_orders)
+        .returning(models.Dish.price, models.Dish.allergen_mask, models.Dish.stock_quantity)
+    ).first()
+    if dish_row is None:
+        db.rollback()
+        return None
+    price, dish_mask, stock_left = dish_row
+
+    # Списываем средства, только если их хватает
+    total_cost = price * num_orders
+    student_mask = db.execute(
+        update(models.User)
+        .where(models.User.id == student_id, models.User.balance >= total_cost)
+        .values(balance=models.User.balance - total_cost)
+        .returning(models.User.allergen_mask)
+    ).scalar()
+    if student_mask is None:
+        db.rollback()
         return None
 
-    # Проверяем баланс студента
-    student = db.query(models.User).filter(models.User.id == student_id).first()
-    if not student:
+    # Блюдо не должно содержать аллергенов ученика
+    conflict = allergen_crud.masks_conflict(dish_mask, student_mask)
+    if conflict is None:
+        conflict = _allergens_overlap(db, order.dish_id, student_id)
+    if conflict:
+        db.rollback()
         return None
 
-    # Calculate total cost based on payment type and subscription weeks
+    # По абонементу сразу создается только первый заказ, остальные недели
+    # хранятся правилом и создаются по мере наступления дней
+    subscription_id = None
     if order.payment_type == "subscription":
-        # For subscription, we need to calculate the total cost for all weeks
-        num_orders = order.subscription_weeks if order.subscription_weeks else 1
-        
-        # Check if the student has enough balance for all orders
-        total_cost = dish.price * num_orders
-        if student.balance < total_cost:
-            return None
-        
-        # Deduct the total cost from the student's balance
-        student.balance -= total_cost
-        
-        # Create multiple orders for each week
-        from datetime import timedelta
-        import calendar
-        
-        # Determine the day of the week for the order
-        order_day = order.order_date.weekday() if order.order_date else datetime.now().weekday()
-        
-        created_orders = []
-        for week in range(num_orders):
-            # Calculate the date for this week's order
-            if order.order_date:
-                order_date = order.order_date + timedelta(weeks=week)
-            else:
-                # If no specific date provided, use the corresponding day of the week for each week
-                days_ahead = order_day - datetime.now().weekday()
-                if days_ahead <= 0:  # Target day already happened this week
-                    days_ahead += 7
-                base_date = datetime.now() + timedelta(days_ahead)
-                order_date = base_date + timedelta(weeks=week)
-            
-            # Create the order
-            db_order = models.Order(
-                student_id=student_id,
-                dish_id=order.dish_id,
-                order_date=order_date,
-                payment_type=order.payment_type
-            )
-            db.add(db_order)
-            created_orders.append(db_order)
-            
-            # Decrease stock quantity for each order
-            dish.stock_quantity -= 1
-        
-        db.commit()
-        
-        # Return the first order (the API expects a single order object)
-        return created_orders[0]
-    
-    else:  # one-time payment
-        if student.balance < dish.price:
-            return None
-
-        # Списание средств
-        student.balance -= dish.price
-
-        # Создание заказа
-        db_order = models.Order(
+        subscription_id = subscription_crud.create_subscription(
+            db, student_id, order.dish_id, service_date, num_orders, price
+        ).id
+
+    db_order = db.scalar(
+        insert(models.Order).values(
             student_id=student_id,
             dish_id=order.dish_id,
-            order_date=order.order_date,
-            payment_type=order.payment_type
-        )
-        db.add(db_order)
-        db.commit()
-        db.refresh(db_order)
+            order_date=order_date,
+            service_date=service_date,
+            payment_type=order.payment_type,
+            subscription_id=subscription_id,
+            price=price
+        ).returning(models.Order)
+    )
+    ledger_crud.record_entries(db, [{
+        "student_id": student_id,
+        "amount": -total_cost,
+        "kind": "order" if subscription_id is None else "subscription",
+        "order_id": db_order.id,
+        "subscription_id": subscription_id
+    }])
+
+    stats_crud.record_new_orders(db, [db_order])
+    order_events.notify(db, order_events.ORDER_CREATED, [db_order.id])
+    db.commit()
+    # Меню показывает остатки, но сбрасываем его, только когда блюдо закончилось
+    if stock_left == 0:
+        menu_cache.invalidate()
+    return db_order
+
+
+def create_cart_orders(db: Session, items: List[schemas.CartItem], student_id: int):
+    """Создать разовые заказы по корзине одной транзакцией.
+
+    Строки с отсутствующим блюдом, нехваткой остатка или аллергенами
+    ученика отклоняются по отдельности; остальные оплачиваются одним
+    условным списанием и вставляются одним INSERT. Если средств не хватает
+    на все принятые строки, не создается ни одного заказа.
+    """
+    lines = [
+        {"index": index, "dish_id": item.dish_id, "order_date": item.order_date, "order_id": None, "error": None}
+        for index, item in enumerate(items)
+    ]
+
+    # Блокируем строки блюд в порядке id, чтобы параллельные корзины не взаимоблокировались
+    dish_ids = sorted({item.dish_id for item in items})
+    dishes = {
+        dish.id: dish
+        for dish in db.query(models.Dish).filter(models.Dish.id.in_(dish_ids))
+        .order_by(models.Dish.id).with_for_update().all()
+    }
+    student_mask = db.query(models.User.allergen_mask).filter(models.User.id == student_id).scalar()
+    if student_mask is None:
+        db.rollback()
+        return None
 
-        # Уменьшаем остаток блюда
-        dish.stock_quantity -= 1
-        db.commit()
+    conflicts = {}
+    for dish in dishes.values():
+        conflicts[dish.id] = allergen_crud.masks_conflict(dish.allergen_mask, student_mask)
+        if conflicts[dish.id] is None:
+            conflicts[dish.id] = _allergens_overlap(db, dish.id, student_id)
 
-        return db_order
+    remaining_stock = {dish.id: dish.stock_quantity or 0 for dish in dishes.values()}
+    accepted = []
+    for line in lines:
+        dish = dishes.get(line["dish_id"])
+        if dish is None:
+            line["error"] = "Блюдо не найдено"
+        elif conflicts[dish.id]:
+            line["error"] = "Блюдо содержит ваши аллергены"
+        elif remaining_stock[dish.id] <= 0:
+            line["error"] = "Блюдо закончилось"
+        else:
+            remaining_stock[dish.id] -= 1
+            accepted.append(line)
 
+    total_cost = sum(dishes[line["dish_id"]].price for line in accepted)
+    if not accepted:
+        db.rollback()
+        return {"orders": [], "lines": lines, "total_cost": 0.0}
 
-def get_user_orders(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+    charged = db.execute(
+        update(models.User)
+        .where(models.User.id == student_id, models.User.balance >= total_cost)
+        .values(balance=models.User.balance - total_cost)
+        .returning(models.User.id)
+    ).scalar()
+    if charged is None:
+        db.rollback()
+        for line in accepted:
+            line["error"] = "Недостаточно средств"
+        return {"orders": [], "lines": lines, "total_cost": 0.0}
+
+    sold_out = False
+    for dish in dishes.values():
+        sold_out = sold_out or ((dish.stock_quantity or 0) > 0 and remaining_stock[dish.id] == 0)
+        dish.stock_quantity = remaining_stock[dish.id]
+
+    created_orders = list(db.scalars(
+        insert(models.Order).returning(models.Order, sort_by_parameter_order=True),
+        [
+            {
+                "student_id": student_id,
+                "dish_id": line["dish_id"],
+                "order_date": line["order_date"],
+                "service_date": service_date_for(line["order_date"]),
+                "payment_type": "one-time",
+                "price": dishes[line["dish_id"]].price
+            }
+            for line in accepted
+        ]
+    ))
+    for line, db_order in zip(accepted, created_orders):
+        line["order_id"] = db_order.id
+    ledger_crud.record_entries(db, [
+        {
+            "student_id": student_id,
+            "amount": -db_order.price,
+            "kind": "order",
+            "order_id": db_order.id
+        }
+        for db_order in created_orders
+    ])
+
+    stats_crud.record_new_orders(db, created_orders)
+
+    order_ids = [db_order.id for db_order in created_orders]
+    order_events.notify(db, order_events.ORDER_CREATED, order_ids)
+    db.commit()
+    if sold_out:
+        menu_cache.invalidate()
+
+    # После commit объекты просрочены: перечитываем заказы одним запросом
+    created_orders = db.query(models.Order).options(joinedload(models.Order.dish))\
+        .filter(models.Order.id.in_(order_ids)).order_by(models.Order.id).all()
+    return {"orders": created_orders, "lines": lines, "total_cost": total_cost}
+
+
+def get_user_orders(db: Session, user_id: int, skip: int = 0, limit: int = 100, after=None):
     """Получить заказы пользователя"""
-    return db.query(models.Order).options(joinedload(models.Order.dish))\
-        .filter(models.Order.student_id == user_id).offset(skip).limit(limit).all()
+    query = db.query(models.Order).options(joinedload(models.Order.dish))\
+        .filter(models.Order.student_id == user_id)
+    return pagination.keyset_page(query, models.Order, skip, limit, after)
 
 
-def get_all_orders(db: Session, skip: int = 0, limit: int = 100):
+def get_all_orders(db: Session, skip: int = 0, limit: int = 100, after=None):
     """Получить все заказы (для повара/админа)"""
-    return db.query(models.Order).options(joinedload(models.Order.dish)).offset(skip).limit(limit).all()
+    query = db.query(models.Order).options(joinedload(models.Order.dish))
+    return pagination.keyset_page(query, models.Order, skip, limit, after)
 
 
-def get_all_orders_with_student(db: Session, skip: int = 0, limit: int = 100):
+def get_all_orders_with_student(db: Session, skip: int = 0, limit: int = 100, after=None):
     """Получить все заказы с информацией о студенте (для повара/админа)"""
-    return db.query(models.Order).options(joinedload(models.Order.dish), joinedload(models.Order.student)).offset(skip).limit(limit).all()
+    query = db.query(models.Order).options(joinedload(models.Order.dish), joinedload(models.Order.student))
+    return pagination.keyset_page(query, models.Order, skip, limit, after)
 
 
 def mark_order_received(db: Session, order_id: int, user_id: int):
@@ -117,25 +246,91 @@ def mark_order_received(db: Session, order_id: int, user_id: int):
     if not order or order.student_id != user_id:
         return None
 
-    order.is_received = True
+    if not order.is_received:
+        order.is_received = True
+        stats_crud.record_order_received(db, order)
+        order_events.notify(db, order_events.ORDER_RECEIVED, [order.id])
     db.commit()
     db.refresh(order)
     return order
 
 
+def mark_orders_received(db: Session, order_ids: List[int]) -> dict:
+    """Отметить выдачу сегодняшних заказов одним UPDATE и одним commit (линия раздачи)"""
+    order_ids = sorted(set(order_ids))
+    today = school_today()
+    ids_param = bindparam("order_ids", order_ids, type_=ARRAY(Integer))
+    received = db.execute(
+        update(models.Order)
+        .where(
+            models.Order.id == any_(ids_param),
+            models.Order.is_received.isnot(True),
+            models.Order.service_date == today
+        )
+        .values(is_received=True)
+        .returning(models.Order.id, models.Order.service_date, models.Order.dish_id, models.Order.payment_type)
+    ).all()
+
+    received_ids = {row.id for row in received}
+    rest = [order_id for order_id in order_ids if order_id not in received_ids]
+    # Почему остальные не отмечены: одним SELECT по тем же id
+    existing = {
+        row.id: row
+        for row in db.execute(
+            select(models.Order.id, models.Order.is_received, models.Order.service_date)
+            .where(models.Order.id == any_(bindparam("rest_ids", rest, type_=ARRAY(Integer))))
+        )
+    } if rest else {}
+
+    stats_crud.record_orders_received(db, received)
+    order_events.notify(db, order_events.ORDER_RECEIVED, sorted(received_ids))
+    db.commit()
+    return {
+        "received": sorted(received_ids),
+        "already_received": [
+            order_id for order_id in rest
+            if order_id in existing and existing[order_id].is_received and existing[order_id].service_date == today
+        ],
+        "not_today": [
+            order_id for order_id in rest
+            if order_id in existing and existing[order_id].service_date != today
+        ],
+        "not_found": [order_id for order_id in rest if order_id not in existing]
+    }
+
+
 def get_today_orders(db: Session):
     """Получить заказы на сегодня (для повара)"""
-    today = datetime.now().date()
-
     return db.query(models.Order).options(joinedload(models.Order.dish)).filter(
-        func.date(func.coalesce(models.Order.order_date, models.Order.created_at)) == today
+        models.Order.service_date == school_today()
     ).all()
 
 
-def get_today_orders_with_student(db: Session):
+def get_today_orders_with_student(db: Session, order_ids: Optional[List[int]] = None):
     """Получить заказы на сегодня с информацией о студенте (для повара)"""
-    today = datetime.now().date()
+    query = db.query(models.Order).options(joinedload(models.Order.dish), joinedload(models.Order.student)).filter(
+        models.Order.service_date == school_today()
+    )
+    if order_ids is not None:
+        # Только перечисленные заказы (события живой ленты повара)
+        query = query.filter(models.Order.id.in_(order_ids)).order_by(models.Order.id)
+    return query.all()
+
+
+def payment_report_query(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    """Запрос строк отчета по оплатам за период (для потоковой выгрузки)"""
+    query = select(
+        models.Order.id,
+        models.Order.student_id,
+        models.Dish.name.label("dish_name"),
+        models.Dish.price,
+        models.Order.payment_type,
+        models.Order.order_date,
+        models.Order.created_at
+    ).join(models.Dish, models.Order.dish_id == models.Dish.id)
 
-    return db.query(models.Order).options(joinedload(models.Order.dish), joinedload(models.Order.student)).filter(
-        func.date(func.coalesce(models.Order.order_date, models.Order.created_at)) == today
-    ).all()
\ No newline at end of file
+    if start_date:
+        query = query.where(models.Order.service_date >= start_date.date())
+    if end_date:
+        query = query.where(models.Order.service_date <= end_date.date())
+    return query.order_by(models.Order.id)
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from .. import models, schemas, pagination
+from ..pending_counts import pending_counts, PURCHASE_REQUESTS
 from typing import List, Optional
 
 
@@ -12,16 +13,18 @@ def create_purchase_request(db: Session, request: schemas.PurchaseRequestCreate,
     db.add(db_request)
     db.commit()
     db.refresh(db_request)
+    if db_request.status == "pending":
+        pending_counts.adjust(PURCHASE_REQUESTS, 1)
     return db_request
 
 
 def get_purchase_requests(db: Session, skip: int = 0, limit: int = 100,
-                         status: Optional[str] = None):
+                         status: Optional[str] = None, after=None):
     """Получить заявки на закупку"""
     query = db.query(models.PurchaseRequest)
     if status:
         query = query.filter(models.PurchaseRequest.status == status)
-    return query.offset(skip).limit(limit).all()
+    return pagination.keyset_page(query, models.PurchaseRequest, skip, limit, after)
 
 
 def update_purchase_request_status(db: Session, request_id: int, status: str):
@@ -31,7 +34,9 @@ def update_purchase_request_status(db: Session, request_id: int, status: str):
     if not request:
         return None
 
+    delta = (status == "pending") - (request.status == "pending")
     request.status = status
     db.commit()
+    pending_counts.adjust(PURCHASE_REQUESTS, delta)
     db.refresh(request)
     return request
\ No newline at end of file
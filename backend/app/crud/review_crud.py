@@ -1,29 +1,82 @@
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from sqlalchemy import func, literal_column, select, update
+from .. import models, schemas, pagination
+from ..menu_cache import menu_cache
 from typing import List, Optional
 
 
+RATING_COLUMNS = ["rating_1", "rating_2", "rating_3", "rating_4", "rating_5"]
+
+
 def create_review(db: Session, review: schemas.ReviewCreate, student_id: int):
-    """Создать отзыв"""
+    """Создать отзыв и обновить агрегаты оценок блюда в той же транзакции"""
     db_review = models.Review(
         **review.model_dump(),
         student_id=student_id
     )
     db.add(db_review)
+
+    bucket = RATING_COLUMNS[review.rating - 1]
+    db.execute(
+        update(models.Dish)
+        .where(models.Dish.id == review.dish_id)
+        .values({
+            "rating_count": models.Dish.rating_count + 1,
+            "rating_sum": models.Dish.rating_sum + review.rating,
+            bucket: getattr(models.Dish, bucket) + 1
+        })
+    )
     db.commit()
+    menu_cache.invalidate()
     db.refresh(db_review)
     return db_review
 
 
-def get_dish_reviews(db: Session, dish_id: int, skip: int = 0, limit: int = 100):
+def rebuild_dish_ratings(db: Session) -> int:
+    """Пересчитать агрегаты оценок всех блюд одним GROUP BY по отзывам"""
+    review = models.Review
+    aggregate = (
+        select(
+            review.dish_id,
+            func.count(review.id).label("rating_count"),
+            func.coalesce(func.sum(review.rating), 0).label("rating_sum"),
+            # Литералы, а не параметры: автоматические имена параметров rating_1…
+            # совпали бы с одноименными колонками в SET того же UPDATE
+            *[
+                func.count(review.id).filter(review.rating == literal_column(str(value))).label(column)
+                for value, column in enumerate(RATING_COLUMNS, start=1)
+            ]
+        )
+        .group_by(review.dish_id)
+        .subquery()
+    )
+    columns = ["rating_count", "rating_sum", *RATING_COLUMNS]
+
+    # Блюда без отзывов обнуляем, остальные берем из агрегата
+    db.execute(
+        update(models.Dish)
+        .where(~models.Dish.id.in_(select(aggregate.c.dish_id)))
+        .values({column: 0 for column in columns})
+    )
+    result = db.execute(
+        update(models.Dish)
+        .where(models.Dish.id == aggregate.c.dish_id)
+        .values({column: aggregate.c[column] for column in columns})
+    )
+    db.commit()
+    menu_cache.invalidate()
+    return result.rowcount
+
+
+def get_dish_reviews(db: Session, dish_id: int, skip: int = 0, limit: int = 100, after=None):
     """Получить отзывы о блюде"""
-    return db.query(models.Review)\
-        .filter(models.Review.dish_id == dish_id)\
-        .offset(skip).limit(limit).all()
+    query = db.query(models.Review)\
+        .filter(models.Review.dish_id == dish_id)
+    return pagination.keyset_page(query, models.Review, skip, limit, after)
 
 
-def get_user_reviews(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+def get_user_reviews(db: Session, user_id: int, skip: int = 0, limit: int = 100, after=None):
     """Получить отзывы пользователя"""
-    return db.query(models.Review)\
-        .filter(models.Review.student_id == user_id)\
-        .offset(skip).limit(limit).all()
\ No newline at end of file
+    query = db.query(models.Review)\
+        .filter(models.Review.student_id == user_id)
+    return pagination.keyset_page(query, models.Review, skip, limit, after)
\ No newline at end of file
@@ -1,47 +1,294 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, exists, func, delete, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from .. import models
+from ..pending_counts import PURCHASE_REQUESTS, BALANCE_TOPUP_REQUESTS
 from typing import List, Optional
-from datetime import datetime
+from collections import defaultdict
+from datetime import date, datetime
 
 
-def get_payment_statistics(db: Session, start_date: Optional[datetime] = None,
-                          end_date: Optional[datetime] = None):
-    """Статистика оплат"""
-    query = db.query(models.Order)
+PAYMENT_GROUPINGS = ("day", "week", "dish", "payment_type")
+
 
+def _filter_period(query, start_date: Optional[datetime], end_date: Optional[datetime]):
     if start_date:
-        query = query.filter(models.Order.created_at >= start_date)
+        query = query.filter(models.DailyOrderStats.service_day >= start_date.date())
     if end_date:
-        query = query.filter(models.Order.created_at <= end_date)
+        query = query.filter(models.DailyOrderStats.service_day <= end_date.date())
+    return query
+
+
+def _payment_group_columns(group_by: str):
+    """Колонки группировки: (ключ, подпись)"""
+    stats = models.DailyOrderStats
+    if group_by == "day":
+        return [stats.service_day], lambda row: (row[0].isoformat(), None)
+    if group_by == "week":
+        week = func.date_trunc("week", stats.service_day)
+        return [week], lambda row: (row[0].date().isoformat(), None)
+    if group_by == "dish":
+        return [models.Dish.id, models.Dish.name], lambda row: (str(row[0]), row[1])
+    return [stats.payment_type], lambda row: (row[0], None)
+
+
+def get_payment_statistics(db: Session, start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None, group_by: Optional[str] = None):
+    """Статистика оплат по сводной таблице, опционально с разбивкой"""
+    stats = models.DailyOrderStats
+    group_columns, describe = _payment_group_columns(group_by) if group_by else ([], None)
+
+    query = db.query(
+        *group_columns,
+        func.coalesce(func.sum(stats.revenue), 0.0),
+        func.coalesce(func.sum(stats.orders_count), 0)
+    ).select_from(stats)
+    if group_by == "dish":
+        query = query.join(models.Dish, stats.dish_id == models.Dish.id)
+    query = _filter_period(query, start_date, end_date)
 
-    orders = query.all()
-    total_revenue = sum(order.dish.price for order in orders)
-    orders_count = len(orders)
+    if not group_by:
+        total_revenue, orders_count = query.one()
+        return {
+            "total_revenue": total_revenue,
+            "orders_count": orders_count,
+            "average_order_value": total_revenue / orders_count if orders_count > 0 else 0
+        }
 
+    rows = query.group_by(*group_columns).order_by(*group_columns).all()
+    breakdown = []
+    for row in rows:
+        key, label = describe(row)
+        revenue, count = row[-2], row[-1]
+        breakdown.append({
+            "key": key,
+            "label": label,
+            "revenue": revenue,
+            "orders_count": count,
+            "average_order_value": revenue / count if count > 0 else 0
+        })
+
+    total_revenue = sum(item["revenue"] for item in breakdown)
+    orders_count = sum(item["orders_count"] for item in breakdown)
     return {
         "total_revenue": total_revenue,
         "orders_count": orders_count,
-        "average_order_value": total_revenue / orders_count if orders_count > 0 else 0
+        "average_order_value": total_revenue / orders_count if orders_count > 0 else 0,
+        "group_by": group_by,
+        "breakdown": breakdown
     }
 
 
 def get_attendance_statistics(db: Session, start_date: Optional[datetime] = None,
                              end_date: Optional[datetime] = None):
-    """Статистика посещаемости"""
-    query = db.query(models.Order)
-
-    # Using order_date for attendance statistics (when meals are scheduled), fallback to created_at if null
+    """Статистика посещаемости по сводке daily_attendance (день x ученик)"""
+    attendance = models.DailyAttendance
+    query = db.query(
+        func.coalesce(func.sum(attendance.orders_count), 0),
+        func.count(func.distinct(attendance.student_id))
+    )
     if start_date:
-        query = query.filter(func.coalesce(models.Order.order_date, models.Order.created_at) >= start_date)
+        query = query.filter(attendance.service_day >= start_date.date())
     if end_date:
-        query = query.filter(func.coalesce(models.Order.order_date, models.Order.created_at) <= end_date)
-
-    unique_users = db.query(func.count(func.distinct(models.Order.student_id))).scalar()
-    total_orders = query.count()
+        query = query.filter(attendance.service_day <= end_date.date())
+    total_orders, unique_users = query.one()
 
     return {
         "unique_users": unique_users,
         "total_orders": total_orders,
         "average_orders_per_user": total_orders / unique_users if unique_users > 0 else 0
-    }
\ No newline at end of file
+    }
+
+
+def record_new_orders(db: Session, orders: List[models.Order]):
+    """Учитывает новые заказы в сводных таблицах (в текущей транзакции, без commit)"""
+    if not orders:
+        return
+
+    groups = defaultdict(lambda: {"orders": 0, "revenue": 0.0})
+    attendance = defaultdict(int)
+    for order in orders:
+        group = groups[(order.service_date, order.dish_id, order.payment_type)]
+        group["orders"] += 1
+        group["revenue"] += order.price or 0.0
+        attendance[(order.service_date, order.student_id)] += 1
+
+    table = models.DailyOrderStats
+    statement = pg_insert(table).values([
+        {
+            "service_day": service_day,
+            "dish_id": dish_id,
+            "payment_type": payment_type,
+            "orders_count": group["orders"],
+            "revenue": group["revenue"],
+            "received_count": 0
+        }
+        for (service_day, dish_id, payment_type), group in groups.items()
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[table.service_day, table.dish_id, table.payment_type],
+        set_={
+            "orders_count": table.orders_count + statement.excluded.orders_count,
+            "revenue": table.revenue + statement.excluded.revenue
+        }
+    ))
+
+    table = models.DailyAttendance
+    statement = pg_insert(table).values([
+        {"service_day": service_day, "student_id": student_id, "orders_count": count}
+        for (service_day, student_id), count in attendance.items()
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[table.service_day, table.student_id],
+        set_={"orders_count": table.orders_count + statement.excluded.orders_count}
+    ))
+
+
+def record_order_received(db: Session, order: models.Order):
+    """Учитывает выдачу заказа в сводной таблице (без commit)"""
+    record_orders_received(db, [order])
+
+
+def record_orders_received(db: Session, orders) -> None:
+    """Учитывает выдачу нескольких заказов: один UPDATE на строку сводной таблицы (без commit)"""
+    table = models.DailyOrderStats
+    groups = defaultdict(int)
+    for order in orders:
+        groups[(order.service_date, order.dish_id, order.payment_type)] += 1
+    for (service_day, dish_id, payment_type), count in groups.items():
+        db.execute(
+            update(table)
+            .where(
+                table.service_day == service_day,
+                table.dish_id == dish_id,
+                table.payment_type == payment_type
+            )
+            .values(received_count=table.received_count + count)
+        )
+
+
+def rebuild_daily_order_stats(db: Session) -> int:
+    """Пересчитать сводные таблицы по всем заказам (по оплаченным ценам)"""
+    order = models.Order
+    table = models.DailyOrderStats
+    db.execute(delete(table))
+    aggregate = (
+        select(
+            order.service_date,
+            order.dish_id,
+            order.payment_type,
+            func.count(order.id),
+            func.coalesce(func.sum(order.price), 0.0),
+            func.count(order.id).filter(order.is_received.is_(True))
+        )
+        .where(order.service_date.isnot(None))
+        .group_by(order.service_date, order.dish_id, order.payment_type)
+    )
+    result = db.execute(
+        insert(table).from_select(
+            ["service_day", "dish_id", "payment_type", "orders_count", "revenue", "received_count"],
+            aggregate
+        )
+    )
+
+    db.execute(delete(models.DailyAttendance))
+    db.execute(
+        insert(models.DailyAttendance).from_select(
+            ["service_day", "student_id", "orders_count"],
+            select(order.service_date, order.student_id, func.count(order.id))
+            .where(order.service_date.isnot(None), order.student_id.isnot(None))
+            .group_by(order.service_date, order.student_id)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def get_production_plan(db: Session, service_day: date) -> dict:
+    """План выдачи на день: заказано, выдано и осталось выдать по блюду и приему пищи.
+
+    Считается по сводной таблице и правилам абонементов, поэтому размер
+    ответа зависит от числа блюд, а не от числа заказов. Заказы по
+    абонементам, которые еще не созданы на этот день, учитываются
+    отдельно в planned. Блюдо из нескольких приемов пищи попадает в
+    каждый из них с одинаковыми числами: тип приема пищи в заказе не хранится.
+    """
+    stats = models.DailyOrderStats
+    ordered = (
+        select(
+            stats.dish_id,
+            func.sum(stats.orders_count).label("ordered"),
+            func.sum(stats.received_count).label("received")
+        )
+        .where(stats.service_day == service_day)
+        .group_by(stats.dish_id)
+        .subquery()
+    )
+    subscription = models.Subscription
+    planned = (
+        select(subscription.dish_id, func.count(subscription.id).label("planned"))
+        .where(
+            subscription.weekday == service_day.weekday(),
+            subscription.start_date <= service_day,
+            subscription.end_date >= service_day,
+            ~exists().where(and_(
+                models.Order.subscription_id == subscription.id,
+                models.Order.service_date == service_day
+            ))
+        )
+        .group_by(subscription.dish_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            models.MealType.name.label("meal_type"),
+            models.Dish.id.label("dish_id"),
+            models.Dish.name.label("dish_name"),
+            func.coalesce(models.Dish.stock_quantity, 0).label("stock_quantity"),
+            func.coalesce(ordered.c.ordered, 0).label("ordered"),
+            func.coalesce(ordered.c.received, 0).label("received"),
+            func.coalesce(planned.c.planned, 0).label("planned")
+        )
+        .select_from(models.Dish)
+        .outerjoin(models.dish_meal_type_association, models.dish_meal_type_association.c.dish_id == models.Dish.id)
+        .outerjoin(models.MealType, models.MealType.id == models.dish_meal_type_association.c.meal_type_id)
+        .outerjoin(ordered, ordered.c.dish_id == models.Dish.id)
+        .outerjoin(planned, planned.c.dish_id == models.Dish.id)
+        .where((ordered.c.dish_id.isnot(None)) | (planned.c.dish_id.isnot(None)))
+        .order_by(models.MealType.name, models.Dish.name)
+    ).all()
+
+    items = [
+        {
+            "meal_type": row.meal_type,
+            "dish_id": row.dish_id,
+            "dish_name": row.dish_name,
+            "stock_quantity": row.stock_quantity,
+            "ordered": row.ordered,
+            "received": row.received,
+            "planned": row.planned,
+            "remaining": row.ordered + row.planned - row.received
+        }
+        for row in rows
+    ]
+    # Итоги по блюдам, а не по строкам: блюдо может входить в несколько приемов пищи
+    per_dish = {item["dish_id"]: item for item in items}.values()
+    return {
+        "service_date": service_day,
+        "items": items,
+        "total_ordered": sum(item["ordered"] + item["planned"] for item in per_dish),
+        "total_received": sum(item["received"] for item in per_dish),
+        "total_remaining": sum(item["remaining"] for item in per_dish)
+    }
+
+
+def count_pending_requests(db: Session) -> dict:
+    """Число ожидающих заявок обоих видов одним запросом (по частичным индексам)"""
+    purchase = db.query(func.count(models.PurchaseRequest.id)).filter(
+        models.PurchaseRequest.status == "pending"
+    ).scalar_subquery()
+    topup = db.query(func.count(models.BalanceTopupRequest.id)).filter(
+        models.BalanceTopupRequest.status == "pending"
+    ).scalar_subquery()
+    purchase_count, topup_count = db.query(purchase, topup).one()
+    return {PURCHASE_REQUESTS: purchase_count, BALANCE_TOPUP_REQUESTS: topup_count}
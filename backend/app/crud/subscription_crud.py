@@ -0,0 +1,111 @@
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .. import models, order_events
+from . import stats_crud
+from ..school_time import SCHOOL_TZ, school_today
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+
+def create_subscription(db: Session, student_id: int, dish_id: int, first_day: date,
+                        weeks: int, price: float) -> models.Subscription:
+    """Создать правило абонемента (без commit)"""
+    subscription = models.Subscription(
+        student_id=student_id,
+        dish_id=dish_id,
+        weekday=first_day.weekday(),
+        start_date=first_day,
+        end_date=first_day + timedelta(weeks=weeks - 1),
+        price=price
+    )
+    db.add(subscription)
+    db.flush()
+    return subscription
+
+
+def materialize_subscription_orders(db: Session, service_day: date) -> int:
+    """Создать заказы по абонементам на день service_day одним INSERT.
+
+    Идемпотентно: уникальный индекс (subscription_id, service_date) и
+    ON CONFLICT DO NOTHING не дают создать заказ дважды, даже если
+    несколько воркеров запускают материализацию одновременно.
+    """
+    due = db.query(models.Subscription).filter(
+        models.Subscription.weekday == service_day.weekday(),
+        models.Subscription.start_date <= service_day,
+        models.Subscription.end_date >= service_day,
+        ~exists().where(and_(
+            models.Order.subscription_id == models.Subscription.id,
+            models.Order.service_date == service_day
+        ))
+    ).all()
+
+    created_orders = []
+    if due:
+        statement = pg_insert(models.Order).on_conflict_do_nothing(
+            index_elements=[models.Order.subscription_id, models.Order.service_date]
+        )
+        created_orders = list(db.scalars(
+            statement.returning(models.Order),
+            [
+                {
+                    "student_id": subscription.student_id,
+                    "dish_id": subscription.dish_id,
+                    "order_date": datetime.combine(service_day, time(), tzinfo=SCHOOL_TZ),
+                    "service_date": service_day,
+                    "payment_type": "subscription",
+                    "subscription_id": subscription.id,
+                    "price": subscription.price
+                }
+                for subscription in due
+            ]
+        ))
+
+        stats_crud.record_new_orders(db, created_orders)
+        order_events.notify(db, order_events.ORDER_CREATED, [order.id for order in created_orders])
+
+    db.commit()
+    return len(created_orders)
+
+
+def get_upcoming_subscription_orders(db: Session, student_id: int) -> List[dict]:
+    """Предстоящие заказы по абонементам, для которых еще нет строк в orders"""
+    today = school_today()
+    subscriptions = db.query(models.Subscription).options(joinedload(models.Subscription.dish)).filter(
+        models.Subscription.student_id == student_id,
+        models.Subscription.end_date >= today
+    ).all()
+    if not subscriptions:
+        return []
+
+    existing = set(
+        db.query(models.Order.subscription_id, models.Order.service_date).filter(
+            models.Order.subscription_id.in_([subscription.id for subscription in subscriptions]),
+            models.Order.service_date >= today
+        ).all()
+    )
+
+    upcoming = []
+    for subscription in subscriptions:
+        day = subscription.start_date
+        if day < today:
+            day += timedelta(weeks=(today - day).days // 7)
+            if day < today:
+                day += timedelta(weeks=1)
+        while day <= subscription.end_date:
+            if (subscription.id, day) not in existing:
+                upcoming.append({
+                    "subscription_id": subscription.id,
+                    "student_id": subscription.student_id,
+                    "dish_id": subscription.dish_id,
+                    "payment_type": "subscription",
+                    "order_date": datetime.combine(day, time(), tzinfo=SCHOOL_TZ),
+                    "service_date": day,
+                    "created_at": subscription.created_at,
+                    "dish": subscription.dish
+                })
+            day += timedelta(weeks=1)
+
+    upcoming.sort(key=lambda item: (item["service_date"], item["subscription_id"]), reverse=True)
+    return upcoming
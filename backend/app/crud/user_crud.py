@@ -1,20 +1,27 @@
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import update
 from .. import models, schemas, auth
-from . import allergen_crud
+from . import allergen_crud, ledger_crud
 from typing import List, Optional
 
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.query(models.User).options(
+        joinedload(models.User.allergens_rel)
+    ).filter(models.User.email == email).first()
+
+
+def get_user_token_state(db: Session, user_id: int):
+    """Версия токена и активность пользователя (для проверки токена без загрузки пользователя)"""
+    return db.query(models.User.token_version, models.User.is_active).filter(models.User.id == user_id).first()
 
 
 def get_user_by_full_name(db: Session, full_name: str):
     return db.query(models.User).filter(models.User.full_name == full_name).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
-
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
+    """Создание пользователя; пароль хешируется заранее, вне сессии БД"""
     db_user = models.User(
         email=user.email,
         full_name=user.full_name,
@@ -32,6 +39,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     if user.allergen_ids:
         allergens = allergen_crud.get_allergens_by_ids(db, user.allergen_ids)
         db_user.allergens_rel = allergens
+        db_user.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in allergens)
         db.commit()
         db.refresh(db_user)
     
@@ -56,8 +64,12 @@ def update_user_profile(db: Session, user_id: int, profile_update: schemas.UserP
             db_user.allergens_rel = allergens
         else:
             db_user.allergens_rel = []
+        db_user.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in db_user.allergens_rel)
 
+    # Аллергены входят в токен, поэтому выпущенные ранее токены устаревают
+    db_user.token_version += 1
     db.commit()
+    auth.remember_token_state(db_user.id, db_user.token_version, db_user.is_active)
     db.refresh(db_user)
     # Reload allergens relationship
     db.refresh(db_user)
@@ -70,7 +82,11 @@ def update_user_balance(db: Session, user_id: int, amount: float):
     if not db_user:
         return None
 
-    db_user.balance += amount
+    # Атомарное изменение: не затираем параллельные списания за заказы
+    db.execute(
+        update(models.User).where(models.User.id == user_id).values(balance=models.User.balance + amount)
+    )
+    ledger_crud.record_entries(db, [{"student_id": user_id, "amount": amount, "kind": "adjustment"}])
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -91,18 +107,29 @@ def update_user_personal_info(db: Session, user_id: int, personal_info_update: s
     return db_user
 
 
-def update_user_password(db: Session, user_id: int, old_password: str, new_password: str):
-    """Обновление пароля пользователя"""
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+def update_user_password(db: Session, user_id: int, hashed_password: str):
+    """Обновление пароля пользователя (старый пароль проверяется до вызова)"""
+    db_user = db.query(models.User).options(joinedload(models.User.allergens_rel)).filter(models.User.id == user_id).first()
     if not db_user:
         return None
 
-    # Проверяем старый пароль
-    if not auth.verify_password(old_password, db_user.hashed_password):
-        return False 
+    db_user.hashed_password = hashed_password
+    db_user.token_version += 1
+    db.commit()
+    auth.remember_token_state(db_user.id, db_user.token_version, db_user.is_active)
+    db.refresh(db_user)
+    return db_user
+
+
+def update_user_active(db: Session, user_id: int, is_active: bool):
+    """Активация/деактивация пользователя (старые токены становятся недействительны)"""
+    db_user = db.query(models.User).options(joinedload(models.User.allergens_rel)).filter(models.User.id == user_id).first()
+    if not db_user:
+        return None
 
-    # Обновляем пароль
-    db_user.hashed_password = auth.get_password_hash(new_password)
+    db_user.is_active = is_active
+    db_user.token_version += 1
     db.commit()
+    auth.remember_token_state(db_user.id, db_user.token_version, db_user.is_active)
     db.refresh(db_user)
     return db_user
\ No newline at end of file
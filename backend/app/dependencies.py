@@ -1,12 +1,19 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from . import auth, crud, schemas, models
-from .database import get_db
+from .database import get_db, run_db
 from sqlalchemy.orm import Session, joinedload
 
 security = HTTPBearer()
 
-def get_current_user(
+STALE_TOKEN_DETAIL = "Токен устарел, войдите заново"
+
+def _load_user(db: Session, email: str):
+    return db.query(models.User).options(
+        joinedload(models.User.allergens_rel)
+    ).filter(models.User.email == email).first()
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
@@ -21,20 +28,78 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.query(models.User).options(
-        joinedload(models.User.allergens_rel)
-    ).filter(models.User.email == token_data["email"]).first()
+    user = await run_db(db, _load_user, token_data["email"])
     if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Пользователь не найден или неактивен",
         )
 
+    auth.remember_token_state(user.id, user.token_version, user.is_active)
+    if token_data["token_version"] != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=STALE_TOKEN_DETAIL,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     return user
 
+async def _principal_from_token(token: str, db: Session) -> schemas.Principal:
+    token_data = auth.verify_token(token)
+
+    if token_data is None or token_data["user_id"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный токен",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Пользователь целиком не загружается, но версия токена и активность
+    # сверяются с БД не реже раза в TOKEN_STATE_TTL_SECONDS
+    user_id = token_data["user_id"]
+    state = auth.cached_token_state(user_id)
+    if state is None:
+        row = await run_db(db, crud.get_user_token_state, user_id)
+        if row is not None:
+            state = (row.token_version, row.is_active)
+            auth.remember_token_state(user_id, *state)
+
+    if state is None or not state[1]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь не найден или неактивен",
+        )
+
+    if token_data["token_version"] != state[0]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=STALE_TOKEN_DETAIL,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return schemas.Principal(
+        id=user_id,
+        email=token_data["email"],
+        role=token_data["role"],
+        allergen_ids=token_data["allergen_ids"],
+        token_version=token_data["token_version"]
+    )
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """Получает пользователя из подписанного токена, сверяя версию токена через кэш (для чтения)"""
+    return await _principal_from_token(credentials.credentials, db)
+
+async def get_stream_principal(token: str = Query(...), db: Session = Depends(get_db)):
+    """Получает пользователя из токена в query-параметре (EventSource не умеет передавать заголовки)"""
+    return await _principal_from_token(token, db)
+
 def require_role(required_role: schemas.UserRole):
     """Декоратор для проверки роли пользователя"""
-    def role_checker(current_user: schemas.User = Depends(get_current_user)):
+    async def role_checker(current_user: schemas.User = Depends(get_current_user)):
         if current_user.role != required_role and current_user.role != schemas.UserRole.ADMIN:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -43,7 +108,7 @@ def require_role(required_role: schemas.UserRole):
         return current_user
     return role_checker
 
-def require_student(current_user: schemas.User = Depends(get_current_user)):
+async def require_student(current_user: schemas.User = Depends(get_current_user)):
     """Проверяет, является ли пользователь учеником"""
     if current_user.role != schemas.UserRole.STUDENT and current_user.role != schemas.UserRole.ADMIN:
         raise HTTPException(
@@ -52,7 +117,7 @@ def require_student(current_user: schemas.User = Depends(get_current_user)):
         )
     return current_user
 
-def require_chef(current_user: schemas.User = Depends(get_current_user)):
+async def require_chef(current_user: schemas.User = Depends(get_current_user)):
     """Проверяет, является ли пользователь поваром"""
     if current_user.role != schemas.UserRole.CHEF and current_user.role != schemas.UserRole.ADMIN:
         raise HTTPException(
@@ -61,11 +126,47 @@ def require_chef(current_user: schemas.User = Depends(get_current_user)):
         )
     return current_user
 
-def require_admin(current_user: schemas.User = Depends(get_current_user)):
+async def require_admin(current_user: schemas.User = Depends(get_current_user)):
     """Проверяет, является ли пользователь администратором"""
     if current_user.role != schemas.UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Требуется роль администратора",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def require_student_principal(principal: schemas.Principal = Depends(get_current_principal)):
+    """Проверяет роль ученика по токену"""
+    if principal.role != schemas.UserRole.STUDENT and principal.role != schemas.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Требуется роль ученика",
+        )
+    return principal
+
+async def require_chef_principal(principal: schemas.Principal = Depends(get_current_principal)):
+    """Проверяет роль повара по токену"""
+    if principal.role != schemas.UserRole.CHEF and principal.role != schemas.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Требуется роль повара",
+        )
+    return principal
+
+async def require_admin_principal(principal: schemas.Principal = Depends(get_current_principal)):
+    """Проверяет роль администратора по токену"""
+    if principal.role != schemas.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Требуется роль администратора",
+        )
+    return principal
+
+async def require_chef_stream_principal(principal: schemas.Principal = Depends(get_stream_principal)):
+    """Проверяет роль повара по токену из query-параметра"""
+    if principal.role != schemas.UserRole.CHEF and principal.role != schemas.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Требуется роль повара",
+        )
+    return principal
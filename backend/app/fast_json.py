@@ -0,0 +1,36 @@
+"""Быстрый путь ответа для больших списков (FAST_JSON_RESPONSES=1).
+
+По умолчанию FastAPI еще раз валидирует результат по response_model,
+переводит его в dict/list и сериализует стандартным json. В быстром
+режиме уже провалидированные в run_db схемы сразу сериализуются в байты
+через TypeAdapter.dump_json (pydantic-core, Rust), и роут возвращает
+готовый ответ. Формат JSON тот же; response_model в декораторе остается
+для документации.
+"""
+from fastapi import Response
+import os
+
+from .database import type_adapter
+
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+
+class PydanticJSONResponse(Response):
+    """Ответ с уже сериализованным JSON"""
+    media_type = "application/json"
+
+
+def respond(data, response_model, response: Response = None):
+    """Вернуть data как есть или, в быстром режиме, готовые байты JSON.
+
+    FastAPI не переносит заголовки из параметра response в возвращенный
+    Response, поэтому они (например, X-Next-Cursor) копируются здесь.
+    """
+    if not FAST_JSON_RESPONSES:
+        return data
+    fast = PydanticJSONResponse(type_adapter(response_model).dump_json(data))
+    if response is not None:
+        fast.raw_headers.extend(response.raw_headers)
+        if response.status_code:
+            fast.status_code = response.status_code
+    return fast
@@ -0,0 +1,91 @@
+"""Пул процессов для хеширования и проверки паролей.
+
+Argon2 специально делается медленным и занимает CPU на десятки
+миллисекунд, поэтому волна входов в начале учебного дня забивала общий
+threadpool и тормозила все остальные эндпоинты. Хеширование вынесено в
+отдельный пул из HASH_WORKERS процессов. Очередь ограничена
+HASH_QUEUE_SIZE задачами: при переполнении сразу возвращается 503,
+а не копится очередь с растущим временем ответа.
+HASH_WORKERS=0 отключает пул: хеширование идет в общем threadpool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import multiprocessing
+import os
+import threading
+
+from . import auth
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", max(HASH_WORKERS, 1) * 8))
+
+
+class HashingOverloaded(Exception):
+    """Очередь на хеширование переполнена"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, а не fork: процесс uvicorn к этому моменту уже многопоточный
+            _executor = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+async def _submit(fn, *args):
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight >= HASH_WORKERS + HASH_QUEUE_SIZE:
+            raise HashingOverloaded()
+        _in_flight += 1
+    try:
+        if HASH_WORKERS <= 0:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+async def hash_password(password: str) -> str:
+    """Хеширует пароль в пуле"""
+    return await _submit(auth.get_password_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет пароль в пуле"""
+    return await _submit(auth.verify_password, plain_password, hashed_password)
+
+
+def _ready() -> int:
+    # Импорт этого модуля в процессе пула подтягивает auth и passlib
+    return os.getpid()
+
+
+async def warm_up():
+    """Запустить процессы пула заранее, чтобы первый вход не ждал их старта"""
+    if HASH_WORKERS <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(HASH_WORKERS)))
+
+
+def shutdown():
+    """Останавливает пул при завершении приложения"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
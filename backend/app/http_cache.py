@@ -0,0 +1,55 @@
+"""Условные GET (ETag / If-None-Match) для меню и справочников.
+
+Для меню слабый ETag считается по содержимому ответа один раз, когда
+список попадает в кэш меню, и хранится рядом с ним: совпавший
+If-None-Match получает 304 без запросов к БД и сериализации. Для
+аллергенов ETag строится из версии данных в БД (число строк и max(id)).
+В обоих случаях одинаковые данные дают одинаковый ETag во всех воркерах.
+"""
+from fastapi import Request, Response, status
+import hashlib
+import os
+
+from .database import type_adapter
+
+ALLERGENS_MAX_AGE_SECONDS = int(os.getenv("ALLERGENS_MAX_AGE_SECONDS", 300))
+
+# Меню зависит от аллергенов пользователя и меняется с остатками:
+# браузер хранит ответ, но перед использованием сверяет ETag
+PRIVATE_REVALIDATE = "private, no-cache"
+ALLERGENS_CACHE_CONTROL = f"public, max-age={ALLERGENS_MAX_AGE_SECONDS}"
+
+
+def make_etag(version: str, *parts) -> str:
+    digest = hashlib.sha1(repr((version, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def content_etag(data, response_model) -> str:
+    """ETag по сериализованному содержимому ответа"""
+    digest = hashlib.sha1(type_adapter(response_model).dump_json(data)).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
@@ -1,22 +1,54 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
 
-from . import models
-from .database import engine
+from . import hashing, subscription_jobs, warmup
+from .auth import ACCESS_TOKEN_HEADER
+from .order_events import order_events
+from .pagination import NEXT_CURSOR_HEADER
 from .routes.public_routes import router as public_router
 from .routes.student_routes import router as student_router
 from .routes.chef_routes import router as chef_router
 from .routes.admin_routes import router as admin_router
 
-# Создаем таблицы в БД
-models.Base.metadata.create_all(bind=engine)
+# Схема БД создается и обновляется отдельно: python -m app.commands migrate
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if warmup.STARTUP_WARMUP:
+        await warmup.warm_up()
+    subscription_task = None
+    if subscription_jobs.SUBSCRIPTION_JOB_INTERVAL_SECONDS > 0:
+        subscription_task = asyncio.create_task(subscription_jobs.run_periodically())
+    yield
+    if subscription_task is not None:
+        subscription_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await subscription_task
+    order_events.shutdown()
+    hashing.shutdown()
+
 
 app = FastAPI(
     title="Школьная столовая - API",
     version="1.0.0",
-    description="API для автоматизированной системы управления школьной столовой"
+    description="API для автоматизированной системы управления школьной столовой",
+    lifespan=lifespan
 )
 
+
+@app.exception_handler(hashing.HashingOverloaded)
+async def hashing_overloaded_handler(request: Request, exc: hashing.HashingOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервер перегружен, повторите попытку позже"},
+        headers={"Retry-After": "1"}
+    )
+
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +56,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ACCESS_TOKEN_HEADER],
 )
 
 # Включение маршрутов
@@ -0,0 +1,84 @@
+"""Кэш меню в памяти процесса.
+
+Меню меняется несколько раз в день, а запрашивается на каждой загрузке
+страницы, поэтому готовые списки schemas.Dish вместе с их ETag хранятся
+в LRU-кэше по ключу (тип приема пищи, исключенные аллергены, skip,
+limit). Изменение блюд, оценок и исчерпание остатка блюда увеличивают
+версию кэша и сбрасывают его; обычный заказ кэш не трогает, поэтому
+stock_quantity в меню может отставать на MENU_CACHE_TTL_SECONDS.
+Кэш локален для процесса: изменения из других воркеров тоже видны
+не позже чем через MENU_CACHE_TTL_SECONDS.
+"""
+from collections import OrderedDict
+from typing import Iterable, Optional
+import os
+import threading
+import time
+
+MENU_CACHE_SIZE = int(os.getenv("MENU_CACHE_SIZE", 256))
+MENU_CACHE_TTL_SECONDS = float(os.getenv("MENU_CACHE_TTL_SECONDS", 30))
+
+
+class MenuCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(meal_type: Optional[str], exclude_allergen_ids: Optional[Iterable[int]], skip: int, limit: int):
+        return meal_type, frozenset(exclude_allergen_ids or ()), skip, limit
+
+    def get(self, key):
+        """Вернуть закэшированный (список блюд, ETag) или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, stored_at, payload = entry
+                if version == self.version and time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, payload, version: int):
+        """Сохранить (список, ETag), прочитанный при версии version.
+
+        Если кэш успели сбросить во время чтения из БД, данные могли
+        устареть, и такой результат не сохраняется.
+        """
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (version, time.monotonic(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Сбросить кэш после изменения блюд или исчерпания остатка"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+            }
+
+
+menu_cache = MenuCache(MENU_CACHE_SIZE, MENU_CACHE_TTL_SECONDS)
@@ -0,0 +1,166 @@
+"""Миграции схемы БД.
+
+create_all создает только отсутствующие таблицы и не трогает уже
+существующие, поэтому новые колонки, индексы и перенос данных для них
+описываются здесь. Каждая миграция выполняется один раз и отмечается
+в таблице schema_migrations; шаги написаны идемпотентно, чтобы на новой
+базе, созданной базовой миграцией через create_all, они проходили без ошибок.
+
+Миграции применяются командой python -m app.commands migrate (в Docker -
+перед запуском uvicorn), а не при импорте приложения.
+"""
+from sqlalchemy import text
+from . import models
+from .school_time import SCHOOL_TIMEZONE
+
+# Произвольная константа для pg_advisory_xact_lock: не даем нескольким
+# воркерам uvicorn применять миграции одновременно
+MIGRATIONS_LOCK_ID = 727_001
+
+
+def _backfill_service_date(connection):
+    connection.execute(
+        text(
+            "UPDATE orders SET service_date = "
+            "(coalesce(order_date, created_at) AT TIME ZONE :timezone)::date "
+            "WHERE service_date IS NULL"
+        ),
+        {"timezone": SCHOOL_TIMEZONE}
+    )
+
+
+def _create_baseline_schema(connection):
+    # Создает только отсутствующие таблицы; на существующей базе ничего не меняет
+    models.Base.metadata.create_all(bind=connection)
+
+
+MIGRATIONS = [
+    ("0000_baseline_schema", [_create_baseline_schema]),
+    ("0001_keyset_pagination_indexes", [
+        "ALTER TABLE reviews ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_student_created_at_id ON orders (student_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_reviews_dish_created_at_id ON reviews (dish_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_reviews_student_created_at_id ON reviews (student_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_purchase_requests_created_at_id ON purchase_requests (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_balance_topup_requests_created_at_id ON balance_topup_requests (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_balance_topup_requests_student_created_at_id "
+        "ON balance_topup_requests (student_id, created_at, id)",
+    ]),
+    ("0002_orders_service_date", [
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS service_date DATE",
+        _backfill_service_date,
+        "CREATE INDEX IF NOT EXISTS ix_orders_service_date_dish_id ON orders (service_date, dish_id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_student_service_date ON orders (student_id, service_date)",
+        # Сводная статистика раньше считала день по часовому поясу сессии БД
+        "DELETE FROM daily_order_stats",
+        "INSERT INTO daily_order_stats "
+        "(service_day, dish_id, payment_type, orders_count, revenue, received_count) "
+        "SELECT o.service_date, o.dish_id, o.payment_type, count(o.id), coalesce(sum(d.price), 0), "
+        "count(o.id) FILTER (WHERE o.is_received) "
+        "FROM orders o JOIN dishes d ON d.id = o.dish_id "
+        "GROUP BY o.service_date, o.dish_id, o.payment_type",
+    ]),
+    ("0003_allergen_masks", [
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS allergen_mask BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS allergen_mask BIGINT NOT NULL DEFAULT 0",
+        "UPDATE dishes d SET allergen_mask = coalesce(("
+        "SELECT bit_or(CASE WHEN da.allergen_id BETWEEN 1 AND 62 "
+        "THEN 1::bigint << (da.allergen_id - 1) ELSE 1::bigint << 62 END) "
+        "FROM dish_allergen da WHERE da.dish_id = d.id), 0)",
+        "UPDATE users u SET allergen_mask = coalesce(("
+        "SELECT bit_or(CASE WHEN ua.allergen_id BETWEEN 1 AND 62 "
+        "THEN 1::bigint << (ua.allergen_id - 1) ELSE 1::bigint << 62 END) "
+        "FROM user_allergen ua WHERE ua.user_id = u.id), 0)",
+    ]),
+    ("0004_user_token_version", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    # Таблицу subscriptions создает create_all; заказы, созданные абонементами
+    # до этой миграции, остаются обычными строками без subscription_id
+    ("0005_subscription_rules", [
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS subscription_id INTEGER REFERENCES subscriptions (id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_orders_subscription_service_date "
+        "ON orders (subscription_id, service_date)",
+    ]),
+    # Таблицы журнала создает create_all; текущие балансы переносим открывающими записями
+    ("0006_balance_ledger", [
+        "INSERT INTO balance_ledger (student_id, amount, kind) "
+        "SELECT u.id, u.balance, 'opening' FROM users u "
+        "WHERE u.balance <> 0 AND NOT EXISTS (SELECT 1 FROM balance_ledger l WHERE l.student_id = u.id)",
+    ]),
+    ("0007_pending_request_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_purchase_requests_pending "
+        "ON purchase_requests (created_at, id) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS ix_balance_topup_requests_pending "
+        "ON balance_topup_requests (created_at, id) WHERE status = 'pending'",
+    ]),
+    ("0008_dish_rating_aggregates", [
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_1 INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_2 INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_3 INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_4 INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS rating_5 INTEGER NOT NULL DEFAULT 0",
+        "UPDATE dishes d SET rating_count = r.rating_count, rating_sum = r.rating_sum, "
+        "rating_1 = r.rating_1, rating_2 = r.rating_2, rating_3 = r.rating_3, "
+        "rating_4 = r.rating_4, rating_5 = r.rating_5 "
+        "FROM (SELECT dish_id, count(*) AS rating_count, coalesce(sum(rating), 0) AS rating_sum, "
+        "count(*) FILTER (WHERE rating = 1) AS rating_1, count(*) FILTER (WHERE rating = 2) AS rating_2, "
+        "count(*) FILTER (WHERE rating = 3) AS rating_3, count(*) FILTER (WHERE rating = 4) AS rating_4, "
+        "count(*) FILTER (WHERE rating = 5) AS rating_5 "
+        "FROM reviews GROUP BY dish_id) r WHERE r.dish_id = d.id",
+    ]),
+    # Цена старых заказов берется из абонемента, затем из журнала оплат,
+    # и только потом из текущей цены блюда
+    ("0009_order_price_and_attendance", [
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS price DOUBLE PRECISION",
+        # Создает таблицу daily_attendance, остальные уже существуют
+        _create_baseline_schema,
+        "UPDATE orders o SET price = s.price FROM subscriptions s "
+        "WHERE s.id = o.subscription_id AND o.price IS NULL",
+        "UPDATE orders o SET price = -l.amount FROM balance_ledger l "
+        "WHERE l.order_id = o.id AND l.kind = 'order' AND o.price IS NULL",
+        "UPDATE orders o SET price = d.price FROM dishes d WHERE d.id = o.dish_id AND o.price IS NULL",
+        "ALTER TABLE daily_order_stats DROP COLUMN IF EXISTS students_count",
+        "DELETE FROM daily_order_stats",
+        "INSERT INTO daily_order_stats "
+        "(service_day, dish_id, payment_type, orders_count, revenue, received_count) "
+        "SELECT service_date, dish_id, payment_type, count(id), coalesce(sum(price), 0), "
+        "count(id) FILTER (WHERE is_received) "
+        "FROM orders WHERE service_date IS NOT NULL "
+        "GROUP BY service_date, dish_id, payment_type",
+        "DELETE FROM daily_attendance",
+        "INSERT INTO daily_attendance (service_day, student_id, orders_count) "
+        "SELECT service_date, student_id, count(id) FROM orders "
+        "WHERE service_date IS NOT NULL AND student_id IS NOT NULL "
+        "GROUP BY service_date, student_id",
+    ]),
+]
+
+
+def run_migrations(engine) -> int:
+    """Применить все еще не примененные миграции"""
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR PRIMARY KEY, "
+            "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+        ))
+        applied = set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+        applied_now = 0
+        for version, steps in MIGRATIONS:
+            if version in applied:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(connection)
+                else:
+                    connection.execute(text(step))
+            connection.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": version})
+            print(f"Применена миграция {version}")
+            applied_now += 1
+    return applied_now
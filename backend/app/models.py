@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Enum, Text, Table
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Float, Enum, Text, Table, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 import enum
 from .database import Base
 
@@ -44,8 +44,12 @@ class User(Base):
     balance = Column(Float, default=0.0)
     allergies = Column(Text, nullable=True)
     preferences = Column(Text, nullable=True)
+    # Битовая маска аллергенов, синхронизируется с allergens_rel (см. allergen_crud.allergen_mask)
+    allergen_mask = Column(BigInteger, default=0, server_default="0", nullable=False)
 
     is_active = Column(Boolean, default=True)
+    # Увеличивается при изменениях, после которых старые токены недействительны
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     orders = relationship("Order", back_populates="student")
@@ -72,12 +76,31 @@ class Dish(Base):
     price = Column(Float, nullable=False)
     stock_quantity = Column(Integer, default=0)
     allergens = Column(Text, nullable=True)
+    # Битовая маска аллергенов, синхронизируется с allergens_rel (см. allergen_crud.allergen_mask)
+    allergen_mask = Column(BigInteger, default=0, server_default="0", nullable=False)
+    # Агрегаты отзывов, обновляются в review_crud.create_review
+    rating_count = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_1 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_2 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_3 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_4 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_5 = Column(Integer, default=0, server_default="0", nullable=False)
 
     orders = relationship("Order", back_populates="dish")
     reviews = relationship("Review", back_populates="dish")
     allergens_rel = relationship("Allergen", secondary=dish_allergen_association, back_populates="dishes")
     meal_types = relationship("MealType", secondary=dish_meal_type_association, back_populates="dishes")
 
+    @property
+    def average_rating(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        """Число оценок 1..5"""
+        return [self.rating_1, self.rating_2, self.rating_3, self.rating_4, self.rating_5]
+
 class Order(Base):
     """Учет выданных блюд и оплат"""
     __tablename__ = "orders"
@@ -87,12 +110,103 @@ class Order(Base):
     dish_id = Column(Integer, ForeignKey("dishes.id"))
 
     order_date = Column(DateTime(timezone=True), nullable=True)
+    # День обслуживания в часовом поясе школы (SCHOOL_TIMEZONE), задается при создании
+    service_date = Column(Date, nullable=True)
     payment_type = Column(String)
     is_received = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Абонемент, по которому создан заказ (None для разовых заказов)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    # Оплаченная цена: по ней считается выручка, даже если цена блюда потом изменится
+    price = Column(Float, nullable=True)
 
     student = relationship("User", back_populates="orders")
     dish = relationship("Dish", back_populates="orders")
+    subscription = relationship("Subscription", back_populates="orders")
+
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_student_created_at_id", "student_id", "created_at", "id"),
+        Index("ix_orders_service_date_dish_id", "service_date", "dish_id"),
+        Index("ix_orders_student_service_date", "student_id", "service_date"),
+        # Заказ по абонементу создается не больше одного раза на день
+        Index("uq_orders_subscription_service_date", "subscription_id", "service_date", unique=True),
+    )
+
+class Subscription(Base):
+    """Абонемент: правило "блюдо по такому-то дню недели с start_date по end_date".
+
+    Оплачивается и резервирует остаток сразу, а строки orders создаются
+    по мере наступления дней (см. subscription_crud.materialize_subscription_orders).
+    """
+    __tablename__ = "subscriptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    dish_id = Column(Integer, ForeignKey("dishes.id"), nullable=False)
+    weekday = Column(Integer, nullable=False)  # 0 - понедельник
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    # Цена на момент покупки: по ней учитывается выручка при создании заказов
+    price = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    student = relationship("User")
+    dish = relationship("Dish")
+    orders = relationship("Order", back_populates="subscription")
+
+    __table_args__ = (
+        Index("ix_subscriptions_weekday_end_date", "weekday", "end_date"),
+        Index("ix_subscriptions_student_end_date", "student_id", "end_date"),
+    )
+
+class DailyOrderStats(Base):
+    """Сводная статистика заказов: день обслуживания x блюдо x тип оплаты"""
+    __tablename__ = "daily_order_stats"
+
+    service_day = Column(Date, primary_key=True)
+    dish_id = Column(Integer, ForeignKey("dishes.id"), primary_key=True)
+    payment_type = Column(String, primary_key=True)
+
+    orders_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)
+    received_count = Column(Integer, default=0, nullable=False)
+
+    dish = relationship("Dish")
+
+class DailyAttendance(Base):
+    """Сводка посещаемости: день обслуживания x ученик (строка есть, если были заказы)"""
+    __tablename__ = "daily_attendance"
+
+    service_day = Column(Date, primary_key=True)
+    student_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    orders_count = Column(Integer, default=0, nullable=False)
+
+class BalanceLedgerEntry(Base):
+    """Журнал движения средств: только добавление, credit > 0, debit < 0"""
+    __tablename__ = "balance_ledger"
+
+    id = Column(BigInteger, primary_key=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    kind = Column(String, nullable=False)  # opening, topup, adjustment, order, subscription
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    topup_request_id = Column(Integer, ForeignKey("balance_topup_requests.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_balance_ledger_student_id_id", "student_id", "id"),
+    )
+
+class BalanceSnapshot(Base):
+    """Последний снимок баланса: сумма журнала по записи ledger_entry_id включительно"""
+    __tablename__ = "balance_snapshots"
+
+    student_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    ledger_entry_id = Column(BigInteger, nullable=False)
+    balance = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class PurchaseRequest(Base):
     """Заявки на закупку продуктов от повара"""
@@ -105,6 +219,12 @@ class PurchaseRequest(Base):
     chef_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_purchase_requests_created_at_id", "created_at", "id"),
+        # Частичный индекс: ожидающих заявок мало, а опрашиваются они постоянно
+        Index("ix_purchase_requests_pending", "created_at", "id", postgresql_where=text("status = 'pending'")),
+    )
+
 
 class BalanceTopupRequest(Base):
     """Заявки на пополнение баланса от студентов (требуют подтверждения админа)"""
@@ -120,6 +240,12 @@ class BalanceTopupRequest(Base):
 
     student = relationship("User", back_populates="topup_requests")
 
+    __table_args__ = (
+        Index("ix_balance_topup_requests_created_at_id", "created_at", "id"),
+        Index("ix_balance_topup_requests_student_created_at_id", "student_id", "created_at", "id"),
+        Index("ix_balance_topup_requests_pending", "created_at", "id", postgresql_where=text("status = 'pending'")),
+    )
+
 
 # Add relationship to User model
 User.topup_requests = relationship("BalanceTopupRequest", back_populates="student")
@@ -133,10 +259,16 @@ class Review(Base):
     dish_id = Column(Integer, ForeignKey("dishes.id"))
     rating = Column(Integer)
     comment = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     student = relationship("User", back_populates="reviews")
     dish = relationship("Dish", back_populates="reviews")
 
+    __table_args__ = (
+        Index("ix_reviews_dish_created_at_id", "dish_id", "created_at", "id"),
+        Index("ix_reviews_student_created_at_id", "student_id", "created_at", "id"),
+    )
+
 class Allergen(Base):
     """Аллергены"""
     __tablename__ = "allergens"
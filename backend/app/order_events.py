@@ -0,0 +1,149 @@
+"""События заказов для живой ленты повара (SSE).
+
+CRUD-функции вызывают notify() внутри своей транзакции: PostgreSQL
+доставляет NOTIFY только после commit и только если транзакция
+закоммичена, поэтому лента не увидит откаченных заказов. В каждом
+воркере uvicorn один поток держит отдельное соединение с LISTEN и
+передает id заказов в event loop; там заказы один раз читаются из БД
+и рассылаются всем подключенным клиентам этого воркера.
+
+LISTEN не работает через PgBouncer в режиме transaction, поэтому для
+слушателя можно указать прямой адрес БД в ORDER_EVENTS_DATABASE_URL.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Iterable
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+
+from .database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_CHANNEL = "order_events"
+ORDER_EVENTS_DATABASE_URL = os.getenv("ORDER_EVENTS_DATABASE_URL", DATABASE_URL)
+# Сколько событий может ждать медленный клиент, прежде чем его отключат
+ORDER_EVENTS_QUEUE_SIZE = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", 100))
+
+ORDER_CREATED = "order_created"
+ORDER_RECEIVED = "order_received"
+
+# Payload NOTIFY ограничен 8000 байт. id заказа (до 10 цифр) с запятой
+# занимает не больше 11 байт, так что 500 id - около 5,5 КБ с запасом
+NOTIFY_IDS_PER_MESSAGE = 500
+
+
+def notify(db: Session, event: str, order_ids: Iterable[int]):
+    """Поставить событие в очередь NOTIFY текущей транзакции (без commit).
+
+    Большие пачки id (массовая выдача, материализация подписок) делятся
+    на несколько уведомлений, чтобы каждое уложилось в лимит payload.
+    """
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), NOTIFY_IDS_PER_MESSAGE):
+        chunk = order_ids[start:start + NOTIFY_IDS_PER_MESSAGE]
+        payload = json.dumps({"event": event, "ids": chunk}, separators=(",", ":"))
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": ORDER_EVENTS_CHANNEL, "payload": payload}
+        )
+
+
+class OrderEventBroker:
+    """Рассылает события заказов подписчикам (SSE-клиентам) одного процесса"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Ссылки на задачи рассылки: event loop держит задачи только слабо
+        self._tasks = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        self._ensure_listener()
+        queue = asyncio.Queue(maxsize=ORDER_EVENTS_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _ensure_listener(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="order-events-listener", daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        # Отдельное соединение psycopg2, а не из пула SQLAlchemy: LISTEN
+        # держит его все время работы процесса
+        import psycopg2
+
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(ORDER_EVENTS_DATABASE_URL)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {ORDER_EVENTS_CHANNEL}")
+                while not self._stop.is_set():
+                    if not select.select([connection], [], [], 5)[0]:
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        payload = json.loads(connection.notifies.pop(0).payload)
+                        self._loop.call_soon_threadsafe(self._dispatch, payload)
+            except (psycopg2.Error, OSError) as error:
+                logger.warning("Лента заказов: соединение LISTEN потеряно (%s), переподключение", error)
+                self._stop.wait(2)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _dispatch(self, payload: dict):
+        if self._subscribers:
+            task = asyncio.create_task(self._publish(payload["event"], payload["ids"]))
+            self._tasks.add(task)
+            task.add_done_callback(self._publish_done)
+
+    def _publish_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Лента заказов: не удалось разослать событие", exc_info=task.exception())
+
+    async def _publish(self, event: str, ids: list):
+        # Импорт здесь: crud сам импортирует этот модуль ради notify()
+        from . import crud, schemas
+        from .database import run_db, session_scope
+
+        # Заказы читаются один раз на процесс, а не на каждого клиента
+        async with session_scope() as db:
+            orders = await run_db(db, crud.get_today_orders_with_student, order_ids=ids,
+                                  response_model=list[schemas.OrderWithStudent])
+        if not orders:
+            return
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event, orders))
+            except asyncio.QueueFull:
+                # Клиент не успевает читать: закрываем его поток, после
+                # переподключения он получит свежий снимок
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def shutdown(self):
+        self._stop.set()
+        for task in list(self._tasks):
+            task.cancel()
+
+
+order_events = OrderEventBroker()
@@ -0,0 +1,52 @@
+"""Keyset-пагинация по (created_at, id).
+
+Клиент получает непрозрачный курсор в заголовке X-Next-Cursor и передает
+его в параметре ?cursor= за следующей страницей. Старые skip/limit
+продолжают работать, но для глубоких страниц курсор не деградирует.
+"""
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import tuple_
+from datetime import datetime
+from typing import Optional, Tuple
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(created_at), int(item_id)
+
+
+def cursor_param(
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor")
+) -> Optional[Tuple[datetime, int]]:
+    """Зависимость: разбирает курсор из запроса"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+
+
+def keyset_page(query, model, skip: int, limit: int, after: Optional[Tuple[datetime, int]] = None):
+    """Страница от новых к старым: по курсору, либо по смещению без курсора"""
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if after is not None:
+        return query.filter(tuple_(model.created_at, model.id) < after).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def set_next_cursor(response: Response, items: list, limit: int):
+    """Выставляет курсор следующей страницы, если страница заполнена"""
+    if items and len(items) >= limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
@@ -0,0 +1,55 @@
+"""Счетчики ожидающих заявок в памяти процесса.
+
+Панель администратора постоянно опрашивает число заявок в статусе
+pending. CRUD-функции заявок сдвигают счетчики после commit, а раз в
+PENDING_COUNTS_RESYNC_SECONDS они сверяются с БД (count по частичным
+индексам WHERE status = 'pending'), чтобы подхватить изменения из других
+воркеров.
+"""
+import os
+import threading
+import time
+
+PENDING_COUNTS_RESYNC_SECONDS = float(os.getenv("PENDING_COUNTS_RESYNC_SECONDS", 60))
+
+PURCHASE_REQUESTS = "purchase_requests"
+BALANCE_TOPUP_REQUESTS = "balance_topup_requests"
+
+
+class PendingCounts:
+    def __init__(self, resync_seconds: float):
+        self.resync_seconds = resync_seconds
+        self.generation = 0
+        self._counts = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def adjust(self, kind: str, delta: int):
+        """Сдвинуть счетчик после изменения заявок в этом процессе"""
+        if not delta:
+            return
+        with self._lock:
+            self.generation += 1
+            if self._counts is not None:
+                self._counts[kind] = max(self._counts[kind] + delta, 0)
+
+    def needs_resync(self) -> bool:
+        with self._lock:
+            return self._counts is None or time.monotonic() - self._synced_at >= self.resync_seconds
+
+    def resync(self, counts: dict, generation: int):
+        """Принять значения из БД, прочитанные, когда счетчики были в поколении generation.
+
+        Если за время чтения заявки менялись, значения сохраняются, но
+        следующий запрос снова сверится с БД.
+        """
+        with self._lock:
+            self._counts = dict(counts)
+            self._synced_at = time.monotonic() if generation == self.generation else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts or {})
+
+
+pending_counts = PendingCounts(PENDING_COUNTS_RESYNC_SECONDS)
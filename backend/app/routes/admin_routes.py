@@ -1,157 +1,333 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional
+import csv
+import io
+import json
+import zlib
 
-from .. import models, schemas, crud, auth, dependencies
-from ..database import get_db
+from .. import schemas, crud, dependencies, pagination
+from ..database import get_db, run_db, get_pool_status, stream_rows
+from ..menu_cache import menu_cache
+from ..pending_counts import pending_counts
 
 router = APIRouter()
 
 
 @router.get("/admin/statistics/payments", response_model=schemas.PaymentStatistics)
-def get_payment_statistics(
+async def get_payment_statistics(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(day|week|dish|payment_type)$",
+                                    description="Разбивка: day, week, dish или payment_type"),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_admin)
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
 ):
     """Получить статистику оплат"""
-    return crud.get_payment_statistics(db, start_date, end_date)
+    return await run_db(db, crud.get_payment_statistics, start_date, end_date, group_by)
 
 
 @router.get("/admin/statistics/attendance", response_model=schemas.AttendanceStatistics)
-def get_attendance_statistics(
+async def get_attendance_statistics(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_admin)
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
 ):
     """Получить статистику посещаемости"""
-    return crud.get_attendance_statistics(db, start_date, end_date)
+    return await run_db(db, crud.get_attendance_statistics, start_date, end_date)
+
+
+@router.post("/admin/statistics/rebuild")
+async def rebuild_statistics(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_admin)
+):
+    """Пересчитать сводную таблицу статистики по всем заказам"""
+    rows = await run_db(db, crud.rebuild_daily_order_stats)
+    return {"message": "Статистика пересчитана", "rows": rows}
+
+
+@router.get("/admin/balances/reconcile", response_model=schemas.BalanceReconciliation)
+async def reconcile_balances(
+    db: Session = Depends(get_db),
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
+):
+    """Сверить балансы пользователей с журналом движения средств"""
+    return await run_db(db, crud.reconcile_balances, response_model=schemas.BalanceReconciliation)
+
+
+@router.post("/admin/balances/snapshots")
+async def take_balance_snapshots(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_admin)
+):
+    """Обновить снимки балансов по журналу движения средств"""
+    rows = await run_db(db, crud.take_balance_snapshots)
+    return {"message": "Снимки балансов обновлены", "rows": rows}
+
+
+@router.get("/admin/pending-counts")
+async def get_pending_counts(
+    db: Session = Depends(get_db),
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
+):
+    """Число ожидающих заявок на закупку и на пополнение баланса"""
+    if pending_counts.needs_resync():
+        generation = pending_counts.generation
+        counts = await run_db(db, crud.count_pending_requests)
+        pending_counts.resync(counts, generation)
+    return pending_counts.snapshot()
+
+
+@router.get("/admin/db-pool")
+async def get_db_pool_status(
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
+):
+    """Состояние пула соединений с БД (занятые, свободные, overflow, время ожидания)"""
+    return get_pool_status()
+
+
+@router.get("/admin/cache/menu")
+async def get_menu_cache_stats(
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
+):
+    """Статистика кэша меню (попадания, промахи, версия)"""
+    return menu_cache.stats()
 
 
 @router.get("/admin/purchase-requests", response_model=list[schemas.PurchaseRequest])
-def get_all_purchase_requests(
+async def get_all_purchase_requests(
+    response: Response,
     status: Optional[str] = Query(None, pattern="^(pending|approved|rejected)$"),
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_admin)
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
 ):
     """Получить все заявки на закупку"""
-    return crud.get_purchase_requests(db, skip=skip, limit=limit, status=status)
+    requests = await run_db(db, crud.get_purchase_requests, skip=skip, limit=limit, status=status, after=after,
+                            response_model=list[schemas.PurchaseRequest])
+    pagination.set_next_cursor(response, requests, limit)
+    return requests
 
 
 @router.patch("/admin/purchase-requests/{request_id}", response_model=schemas.PurchaseRequest)
-def update_purchase_request_status(
+async def update_purchase_request_status(
     request_id: int,
     status_update: schemas.PurchaseRequestUpdate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_admin)
 ):
     """Обновить статус заявки на закупку (согласование)"""
-    request = crud.update_purchase_request_status(db, request_id, status_update.status)
+    request = await run_db(db, crud.update_purchase_request_status, request_id, status_update.status,
+                           response_model=schemas.PurchaseRequest)
     if not request:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
     return request
 
 
 @router.get("/admin/balance-topup-requests", response_model=list[schemas.BalanceTopupRequest])
-def get_all_balance_topup_requests(
+async def get_all_balance_topup_requests(
+    response: Response,
     status: Optional[str] = Query(None, pattern="^(pending|approved|rejected)$"),
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_admin)
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
 ):
     """Получить все заявки на пополнение баланса"""
-    return crud.get_all_topup_requests(db, skip=skip, limit=limit, status=status)
+    requests = await run_db(db, crud.get_all_topup_requests, skip=skip, limit=limit, status=status, after=after,
+                            response_model=list[schemas.BalanceTopupRequest])
+    pagination.set_next_cursor(response, requests, limit)
+    return requests
 
 
 @router.patch("/admin/balance-topup-requests/{request_id}", response_model=schemas.BalanceTopupRequest)
-def update_balance_topup_request_status(
+async def update_balance_topup_request_status(
     request_id: int,
     status_update: schemas.BalanceTopupRequestUpdate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_admin)
 ):
     """Обновить статус заявки на пополнение баланса (согласование)"""
-    request = crud.update_topup_request_status(
+    request = await run_db(
         db,
+        crud.update_topup_request_status,
         request_id,
         status_update.status,
-        status_update.admin_comment
+        status_update.admin_comment,
+        response_model=schemas.BalanceTopupRequest
     )
     if not request:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
     return request
 
 
+@router.post("/admin/balance-topup-requests/batch", response_model=schemas.BalanceTopupBatchResult)
+async def batch_update_balance_topup_requests(
+    batch: schemas.BalanceTopupBatchUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_admin)
+):
+    """Одобрить или отклонить ожидающие заявки списком id или по правилу (сумма, параллель)"""
+    if batch.ids is None and batch.max_amount is None and batch.parallel is None:
+        raise HTTPException(status_code=400, detail="Укажите ids или правило отбора заявок")
+    return await run_db(
+        db,
+        crud.batch_update_topup_requests,
+        batch.status,
+        ids=batch.ids,
+        max_amount=batch.max_amount,
+        parallel=batch.parallel,
+        admin_comment=batch.admin_comment,
+        response_model=schemas.BalanceTopupBatchResult
+    )
+
+
+@router.patch("/admin/users/{user_id}/active", response_model=schemas.User)
+async def update_user_active(
+    user_id: int,
+    active_update: schemas.UserActiveUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_admin)
+):
+    """Заблокировать или разблокировать пользователя (выданные токены перестают действовать)"""
+    user = await run_db(db, crud.update_user_active, user_id, active_update.is_active,
+                        response_model=schemas.User)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return user
+
+
 @router.post("/admin/dishes", response_model=schemas.Dish, status_code=status.HTTP_201_CREATED)
-def create_dish(
+async def create_dish(
     dish: schemas.DishCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_admin)
 ):
     """Создать новое блюдо"""
-    return crud.create_dish(db, dish)
+    return await run_db(db, crud.create_dish, dish, response_model=schemas.Dish)
 
 
 @router.patch("/admin/dishes/{dish_id}", response_model=schemas.Dish)
-def update_dish(
+async def update_dish(
     dish_id: int,
     dish_update: schemas.DishUpdate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_admin)
 ):
     """Обновить информацию о блюде"""
-    dish = crud.update_dish(db, dish_id, dish_update)
+    dish = await run_db(db, crud.update_dish, dish_id, dish_update, response_model=schemas.Dish)
     if not dish:
         raise HTTPException(status_code=404, detail="Блюдо не найдено")
     return dish
 
 
 @router.delete("/admin/dishes/{dish_id}")
-def delete_dish(
+async def delete_dish(
     dish_id: int,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_admin)
 ):
     """Удалить блюдо"""
-    dish = crud.delete_dish(db, dish_id)
+    dish = await run_db(db, crud.delete_dish, dish_id)
     if not dish:
         raise HTTPException(status_code=404, detail="Блюдо не найдено")
     return {"message": "Блюдо удалено"}
 
 
+REPORT_COLUMNS = ["id", "student_id", "dish_name", "price", "payment_type", "order_date", "created_at"]
+
+
+def _report_row(row) -> list:
+    return [value.isoformat() if isinstance(value, datetime) else value for value in row]
+
+
+async def _report_json(rows, stats: dict, start_date: Optional[datetime], end_date: Optional[datetime]):
+    head = json.dumps({
+        "statistics": stats,
+        "period": {
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None
+        }
+    }, ensure_ascii=False)
+    yield head[:-1] + ', "orders": ['
+    first = True
+    async for partition in rows:
+        chunk = ",".join(
+            json.dumps(dict(zip(REPORT_COLUMNS, _report_row(row))), ensure_ascii=False)
+            for row in partition
+        )
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]}"
+
+
+async def _report_ndjson(rows):
+    async for partition in rows:
+        yield "".join(
+            json.dumps(dict(zip(REPORT_COLUMNS, _report_row(row))), ensure_ascii=False) + "\n"
+            for row in partition
+        )
+
+
+async def _report_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    async for partition in rows:
+        writer.writerows(_report_row(row) for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+REPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
 @router.get("/admin/reports/payments")
-def generate_payment_report(
+async def generate_payment_report(
+    request: Request,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$", description="Формат выгрузки: json, ndjson или csv"),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_admin)
+    current_user: schemas.Principal = Depends(dependencies.require_admin_principal)
 ):
-    """Сформировать отчет по оплатам"""
-    stats = crud.get_payment_statistics(db, start_date, end_date)
-    orders = crud.get_all_orders(db, limit=1000)
+    """Сформировать отчет по оплатам (потоковая выгрузка за период)"""
+    rows = stream_rows(crud.payment_report_query(start_date, end_date))
+    if format == "json":
+        stats = await run_db(db, crud.get_payment_statistics, start_date, end_date)
+        body = _report_json(rows, stats, start_date, end_date)
+    elif format == "ndjson":
+        body = _report_ndjson(rows)
+    else:
+        body = _report_csv(rows)
 
-    return {
-        "statistics": stats,
-        "period": {
-            "start_date": start_date,
-            "end_date": end_date
-        },
-        "orders": [
-            {
-                "id": order.id,
-                "student_id": order.student_id,
-                "dish_name": order.dish.name,
-                "price": order.dish.price,
-                "payment_type": order.payment_type,
-                "order_date": order.order_date,
-                "created_at": order.created_at
-            }
-            for order in orders
-        ]
-    }
\ No newline at end of file
+    headers = {"Vary": "Accept-Encoding"}
+    if format != "json":
+        headers["Content-Disposition"] = f'attachment; filename="payments_report.{format}"'
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        body = _gzip(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=REPORT_MEDIA_TYPES[format], headers=headers)
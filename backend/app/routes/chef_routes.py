@@ -1,62 +1,170 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from datetime import date
 from typing import Optional
+import asyncio
 
-from .. import models, schemas, crud, auth, dependencies
-from ..database import get_db
+from .. import schemas, crud, auth, dependencies, fast_json, http_cache, pagination
+from ..database import get_db, run_db, session_scope, type_adapter
+from ..menu_cache import menu_cache
+from ..order_events import order_events
+from ..school_time import school_today
 
 router = APIRouter()
 
+# Раз в сколько секунд слать комментарий, чтобы прокси не закрывали простаивающий поток
+ORDER_STREAM_HEARTBEAT_SECONDS = 15
+
+
+def _sse(event: str, orders) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + type_adapter(list[schemas.OrderWithStudent]).dump_json(orders) + b"\n\n"
+
 
 @router.get("/chef/orders", response_model=list[schemas.OrderWithStudent])
-def get_all_orders(
+async def get_all_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_chef)
+    current_user: schemas.Principal = Depends(dependencies.require_chef_principal)
 ):
     """Просмотр всех заказов (для учета выданных блюд)"""
-    return crud.get_all_orders_with_student(db, skip=skip, limit=limit)
+    orders = await run_db(db, crud.get_all_orders_with_student, skip=skip, limit=limit, after=after,
+                          response_model=list[schemas.OrderWithStudent])
+    pagination.set_next_cursor(response, orders, limit)
+    return fast_json.respond(orders, list[schemas.OrderWithStudent], response)
 
 
 @router.get("/chef/orders/today", response_model=list[schemas.OrderWithStudent])
-def get_today_orders(
+async def get_today_orders(
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_chef)
+    current_user: schemas.Principal = Depends(dependencies.require_chef_principal)
 ):
     """Получить заказы на сегодня"""
-    return crud.get_today_orders_with_student(db)
+    orders = await run_db(db, crud.get_today_orders_with_student, response_model=list[schemas.OrderWithStudent])
+    return fast_json.respond(orders, list[schemas.OrderWithStudent])
+
+
+@router.get("/chef/orders/stream")
+async def stream_today_orders(
+    request: Request,
+    current_user: schemas.Principal = Depends(dependencies.require_chef_stream_principal)
+):
+    """Живая лента заказов на сегодня (Server-Sent Events).
+
+    Сначала приходит событие snapshot со всеми заказами дня, затем
+    order_created и order_received только с изменившимися заказами.
+    """
+    async def events():
+        # Подписываемся до чтения снимка, чтобы не пропустить заказы между ними
+        queue = order_events.subscribe()
+        try:
+            async with session_scope() as db:
+                orders = await run_db(db, crud.get_today_orders_with_student,
+                                      response_model=list[schemas.OrderWithStudent])
+            yield _sse("snapshot", orders)
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(queue.get(), ORDER_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            order_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/chef/orders/receive", response_model=schemas.OrderReceiveBatchResult)
+async def mark_orders_received(
+    batch: schemas.OrderReceiveBatch,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_chef)
+):
+    """Отметить выдачу пачки сегодняшних заказов по id или токенам из QR-кодов"""
+    order_ids = list(batch.order_ids)
+    invalid_tokens = []
+    for token in batch.tokens:
+        order_id = auth.parse_receive_token(token)
+        if order_id is None:
+            invalid_tokens.append(token)
+        else:
+            order_ids.append(order_id)
+
+    result = {"received": [], "already_received": [], "not_today": [], "not_found": []}
+    if order_ids:
+        result = await run_db(db, crud.mark_orders_received, order_ids)
+    return {**result, "invalid_tokens": invalid_tokens}
+
+
+@router.get("/chef/production-plan", response_model=schemas.ProductionPlan)
+async def get_production_plan(
+    service_date: Optional[date] = Query(None, alias="date", description="День обслуживания, по умолчанию сегодня"),
+    db: Session = Depends(get_db),
+    current_user: schemas.Principal = Depends(dependencies.require_chef_principal)
+):
+    """Сколько порций каждого блюда заказано, выдано и осталось выдать"""
+    return await run_db(db, crud.get_production_plan, service_date or school_today(),
+                        response_model=schemas.ProductionPlan)
 
 
 @router.get("/chef/dishes", response_model=list[schemas.Dish])
-def get_all_dishes_with_stock(
+async def get_all_dishes_with_stock(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_chef)
+    current_user: schemas.Principal = Depends(dependencies.require_chef_principal)
 ):
     """Просмотр блюд с остатками (контроль остатков)"""
-    dishes = crud.get_dishes(db, skip=skip, limit=limit)
-    return dishes
+    cache_key = menu_cache.make_key(None, None, skip, limit)
+    cached = menu_cache.get(cache_key)
+    if cached is None:
+        version = menu_cache.version
+        dishes = await run_db(db, crud.get_dishes, skip=skip, limit=limit, response_model=list[schemas.Dish])
+        cached = dishes, http_cache.content_etag(dishes, list[schemas.Dish])
+        menu_cache.put(cache_key, cached, version)
+
+    dishes, etag = cached
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, http_cache.PRIVATE_REVALIDATE)
+    http_cache.set_cache_headers(response, etag, http_cache.PRIVATE_REVALIDATE)
+    return fast_json.respond(dishes, list[schemas.Dish], response)
 
 
 @router.post("/chef/purchase-requests", response_model=schemas.PurchaseRequest, status_code=status.HTTP_201_CREATED)
-def create_purchase_request(
+async def create_purchase_request(
     request: schemas.PurchaseRequestCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_chef)
 ):
     """Создать заявку на закупку продуктов"""
-    return crud.create_purchase_request(db, request, current_user.id)
+    return await run_db(db, crud.create_purchase_request, request, current_user.id,
+                        response_model=schemas.PurchaseRequest)
 
 
 @router.get("/chef/purchase-requests/my", response_model=list[schemas.PurchaseRequest])
-def get_my_purchase_requests(
+async def get_my_purchase_requests(
+    response: Response,
     status: Optional[str] = Query(None, pattern="^(pending|approved|rejected)$"),
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_chef)
+    current_user: schemas.Principal = Depends(dependencies.require_chef_principal)
 ):
     """Получить мои заявки на закупку"""
-    return crud.get_purchase_requests(db, skip=skip, limit=limit, status=status)
\ No newline at end of file
+    requests = await run_db(db, crud.get_purchase_requests, skip=skip, limit=limit, status=status, after=after,
+                            response_model=list[schemas.PurchaseRequest])
+    pagination.set_next_cursor(response, requests, limit)
+    return requests
\ No newline at end of file
@@ -1,31 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-import os
 
-from .. import models, schemas, crud, auth, dependencies
-from ..database import get_db
-from ..seed import seed_database
+from .. import schemas, crud, auth, hashing, http_cache
+from ..database import get_db, run_db
 
 router = APIRouter()
 
 # ========== Публичные эндпоинты ==========
 
 @router.get("/")
-def read_root():
+async def read_root():
     return {"message": "Добро пожаловать в API школьной столовой!"}
 
 
 @router.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
 
 
 @router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Регистрация нового пользователя"""
     # Проверяем email
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await run_db(db, crud.get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -33,32 +30,37 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
     # Проверяем ФИО
-    db_user = crud.get_user_by_full_name(db, full_name=user.full_name)
+    db_user = await run_db(db, crud.get_user_by_full_name, full_name=user.full_name)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь с таким ФИО уже зарегистрирован"
         )
 
-    return crud.create_user(db=db, user=user)
+    hashed_password = await hashing.hash_password(user.password)
+    return await run_db(db, crud.create_user, user=user, hashed_password=hashed_password,
+                        response_model=schemas.User)
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     """Авторизация и получение JWT токена"""
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await run_db(db, crud.get_user_by_email, email=user.email)
 
-    if not db_user or not auth.verify_password(user.password, db_user.hashed_password):
+    # Argon2 нагружает CPU, поэтому проверяем пароль в отдельном пуле процессов
+    if not db_user or not await hashing.verify_password(user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
         )
 
-    access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)))
-    access_token = auth.create_access_token(
-        data={"sub": db_user.email, "role": db_user.role.value},
-        expires_delta=access_token_expires
-    )
+    if not db_user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь неактивен",
+        )
+
+    access_token = auth.create_user_token(db_user)
 
     return {
         "access_token": access_token,
@@ -68,17 +70,24 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/allergens", response_model=list[schemas.Allergen])
-def get_allergens(
+async def get_allergens(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
     """Получить список всех аллергенов (публичный эндпоинт)"""
-    return crud.get_all_allergens(db, skip=skip, limit=limit)
+    etag = http_cache.make_etag(await run_db(db, crud.get_allergens_version), skip, limit)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, http_cache.ALLERGENS_CACHE_CONTROL)
+    http_cache.set_cache_headers(response, etag, http_cache.ALLERGENS_CACHE_CONTROL)
+    return await run_db(db, crud.get_all_allergens, skip=skip, limit=limit,
+                        response_model=list[schemas.Allergen])
 
 
 @router.post("/seed")
-def seed_test_data(
+async def seed_test_data(
     db: Session = Depends(get_db)
 ):
     """
@@ -86,4 +95,7 @@ def seed_test_data(
     Только для администратора в демонстрационных целей.
     """
     print("test")
-    return seed_database(db)
\ No newline at end of file
+    # seed нужен только для демо-данных: не импортируем его при старте
+    from ..seed import seed_database
+
+    return await run_db(db, seed_database)
\ No newline at end of file
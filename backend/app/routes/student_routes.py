@@ -1,116 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from datetime import datetime
 from typing import Optional
 
-from .. import models, schemas, crud, auth, dependencies
-from ..database import get_db
+from .. import schemas, crud, auth, dependencies, fast_json, hashing, http_cache, pagination
+from ..database import get_db, run_db
+from ..menu_cache import menu_cache
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=schemas.User)
-def get_current_user_profile(current_user: schemas.User = Depends(dependencies.get_current_user)):
+async def get_current_user_profile(current_user: schemas.User = Depends(dependencies.get_current_user)):
     """Получить информацию о текущем пользователе"""
     return current_user
 
 
 @router.patch("/me/profile", response_model=schemas.User)
-def update_profile(
+async def update_profile(
     profile_update: schemas.UserProfileUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_student)
 ):
     """Обновить профиль (аллергии, предпочтения)"""
-    updated_user = crud.update_user_profile(db, current_user.id, profile_update)
+    updated_user = await run_db(db, crud.update_user_profile, current_user.id, profile_update,
+                                response_model=schemas.User)
     if not updated_user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
+    # Аллергены записаны в токен, поэтому выдаем новый вместо устаревшего
+    response.headers[auth.ACCESS_TOKEN_HEADER] = auth.create_user_token(updated_user)
     return updated_user
 
 
 @router.patch("/me/personal-info", response_model=schemas.User)
-def update_personal_info(
+async def update_personal_info(
     personal_info_update: schemas.UserPersonalInfoUpdate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.get_current_user)
 ):
     """Обновить личную информацию (ФИО, параллель)"""
-    updated_user = crud.update_user_personal_info(db, current_user.id, personal_info_update)
+    updated_user = await run_db(db, crud.update_user_personal_info, current_user.id, personal_info_update,
+                                response_model=schemas.User)
     if not updated_user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return updated_user
 
 
 @router.patch("/me/password", response_model=dict)
-def update_password(
+async def update_password(
     password_update: schemas.PasswordUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.get_current_user)
 ):
     """Обновить пароль"""
-    result = crud.update_user_password(db, current_user.id, password_update.old_password, password_update.new_password)
+    if not await hashing.verify_password(password_update.old_password, current_user.hashed_password):
+        raise HTTPException(status_code=400, detail="Неверный старый пароль")
+    hashed_password = await hashing.hash_password(password_update.new_password)
+    result = await run_db(db, crud.update_user_password, current_user.id, hashed_password,
+                          response_model=schemas.User)
     if result is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    elif result is False:
-        raise HTTPException(status_code=400, detail="Неверный старый пароль")
+    response.headers[auth.ACCESS_TOKEN_HEADER] = auth.create_user_token(result)
     return {"message": "Пароль успешно обновлен"}
 
 
 @router.post("/me/balance/topup", response_model=schemas.BalanceTopupRequest, status_code=status.HTTP_201_CREATED)
-def request_balance_topup(
+async def request_balance_topup(
     balance_update: schemas.UserBalanceUpdate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_student)
 ):
     """Создать заявку на пополнение баланса (требует подтверждения админа)"""
-    topup_request = crud.create_topup_request(db, current_user.id, balance_update.amount)
+    topup_request = await run_db(db, crud.create_topup_request, current_user.id, balance_update.amount,
+                                 response_model=schemas.BalanceTopupRequest)
     return topup_request
 
 
 @router.get("/me/balance/requests", response_model=list[schemas.BalanceTopupRequest])
-def get_my_topup_requests(
+async def get_my_topup_requests(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = Query(None, pattern="^(pending|approved|rejected)$"),
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_student)
+    current_user: schemas.Principal = Depends(dependencies.require_student_principal)
 ):
     """Получить мои заявки на пополнение баланса"""
-    return crud.get_student_topup_requests(db, current_user.id, skip=skip, limit=limit, status=status)
+    requests = await run_db(db, crud.get_student_topup_requests, current_user.id, skip=skip, limit=limit,
+                            status=status, after=after, response_model=list[schemas.BalanceTopupRequest])
+    pagination.set_next_cursor(response, requests, limit)
+    return requests
 
 
 @router.get("/menu", response_model=list[schemas.Dish])
-def get_menu(
+async def get_menu(
+    request: Request,
+    response: Response,
     meal_type: Optional[str] = Query(None, description="Фильтр по типу приема пищи: breakfast - завтрак, lunch - обед"),
     exclude_allergens: Optional[bool] = Query(True, description="Исключить блюда с аллергенами пользователя"),
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.get_current_user)
+    principal: schemas.Principal = Depends(dependencies.get_current_principal)
 ):
     """Просмотр меню с фильтрацией по аллергенам"""
     exclude_allergen_ids = None
-    if exclude_allergens and current_user.allergens_rel:
-        exclude_allergen_ids = [allergen.id for allergen in current_user.allergens_rel]
+    if exclude_allergens and principal.allergen_ids:
+        exclude_allergen_ids = principal.allergen_ids
+
+    cache_key = menu_cache.make_key(meal_type, exclude_allergen_ids, skip, limit)
+    cached = menu_cache.get(cache_key)
+    if cached is None:
+        version = menu_cache.version
+        dishes = await run_db(
+            db,
+            crud.get_dishes,
+            skip=skip,
+            limit=limit,
+            meal_type=meal_type,
+            exclude_allergen_ids=exclude_allergen_ids,
+            response_model=list[schemas.Dish]
+        )
+        cached = dishes, http_cache.content_etag(dishes, list[schemas.Dish])
+        menu_cache.put(cache_key, cached, version)
 
-    dishes = crud.get_dishes(
-        db,
-        skip=skip,
-        limit=limit,
-        meal_type=meal_type,
-        exclude_allergen_ids=exclude_allergen_ids
-    )
-    return dishes
+    dishes, etag = cached
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, http_cache.PRIVATE_REVALIDATE)
+    http_cache.set_cache_headers(response, etag, http_cache.PRIVATE_REVALIDATE)
+    return fast_json.respond(dishes, list[schemas.Dish], response)
 
 
 @router.post("/orders", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
-def create_order(
+async def create_order(
     order: schemas.OrderCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_student)
 ):
     """Создать заказ (оплата питания)"""
-    result = crud.create_order(db, order, current_user.id)
+    result = await run_db(db, crud.create_order, order, current_user.id, response_model=schemas.Order)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -119,48 +149,84 @@ def create_order(
     return result
 
 
+@router.post("/orders/cart", response_model=schemas.CartResult, status_code=status.HTTP_201_CREATED)
+async def create_cart_orders(
+    cart: schemas.CartCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(dependencies.require_student)
+):
+    """Оформить корзину разовых заказов одним запросом (результат по каждой строке)"""
+    result = await run_db(db, crud.create_cart_orders, cart.items, current_user.id,
+                          response_model=schemas.CartResult)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if not result.orders:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+    return result
+
+
 @router.get("/orders/my", response_model=list[schemas.Order])
-def get_my_orders(
+async def get_my_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.require_student)
+    current_user: schemas.Principal = Depends(dependencies.require_student_principal)
 ):
     """Получить мои заказы"""
-    orders = crud.get_user_orders(db, current_user.id, skip=skip, limit=limit)
-    return orders
+    orders = await run_db(db, crud.get_user_orders, current_user.id, skip=skip, limit=limit, after=after,
+                          response_model=list[schemas.Order])
+    pagination.set_next_cursor(response, orders, limit)
+    return fast_json.respond(orders, list[schemas.Order], response)
+
+
+@router.get("/orders/upcoming", response_model=list[schemas.UpcomingOrder])
+async def get_my_upcoming_orders(
+    db: Session = Depends(get_db),
+    current_user: schemas.Principal = Depends(dependencies.require_student_principal)
+):
+    """Предстоящие заказы по абонементам, еще не созданные в orders (без пагинации: их не больше недель абонемента)"""
+    return await run_db(db, crud.get_upcoming_subscription_orders, current_user.id,
+                        response_model=list[schemas.UpcomingOrder])
 
 
 @router.post("/orders/{order_id}/receive", response_model=schemas.Order)
-def mark_order_received(
+async def mark_order_received(
     order_id: int,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_student)
 ):
     """Отметить заказ как полученный"""
-    order = crud.mark_order_received(db, order_id, current_user.id)
+    order = await run_db(db, crud.mark_order_received, order_id, current_user.id, response_model=schemas.Order)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден или у вас нет прав")
     return order
 
 
 @router.post("/reviews", response_model=schemas.Review, status_code=status.HTTP_201_CREATED)
-def create_review(
+async def create_review(
     review: schemas.ReviewCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(dependencies.require_student)
 ):
     """Оставить отзыв о блюде"""
-    return crud.create_review(db, review, current_user.id)
+    return await run_db(db, crud.create_review, review, current_user.id, response_model=schemas.Review)
 
 
 @router.get("/dishes/{dish_id}/reviews", response_model=list[schemas.Review])
-def get_dish_reviews(
+async def get_dish_reviews(
     dish_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after=Depends(pagination.cursor_param),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(dependencies.get_current_user)
+    current_user: schemas.Principal = Depends(dependencies.get_current_principal)
 ):
     """Получить отзывы о блюде"""
-    return crud.get_dish_reviews(db, dish_id, skip=skip, limit=limit)
\ No newline at end of file
+    reviews = await run_db(db, crud.get_dish_reviews, dish_id, skip=skip, limit=limit, after=after,
+                           response_model=list[schemas.Review])
+    pagination.set_next_cursor(response, reviews, limit)
+    return reviews
\ No newline at end of file
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, EmailStr, Field
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, computed_field, model_validator
+from datetime import date, datetime
 from typing import Optional, List
 from enum import Enum
 
+from . import auth
+
 class UserRole(str, Enum):
     STUDENT = "student"
     CHEF = "chef"
@@ -37,6 +39,9 @@ class PasswordUpdate(BaseModel):
 class UserBalanceUpdate(BaseModel):
     amount: float = Field(..., gt=0)
 
+class UserActiveUpdate(BaseModel):
+    is_active: bool
+
 class User(UserBase):
     id: int
     role: UserRole
@@ -46,6 +51,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     allergens_rel: Optional[List[Allergen]] = []
+    token_version: int = 0
     
     class Config:
         from_attributes = True
@@ -64,6 +70,14 @@ class TokenData(BaseModel):
     email: Optional[str] = None
     role: Optional[UserRole] = None
 
+class Principal(BaseModel):
+    """Пользователь по данным подписанного токена (без запроса к БД)"""
+    id: int
+    email: str
+    role: UserRole
+    allergen_ids: List[int] = []
+    token_version: int = 0
+
 # Схемы для типов приемов пищи
 class MealTypeBase(BaseModel):
     name: str
@@ -103,6 +117,9 @@ class Dish(DishBase):
     id: int
     allergens_rel: Optional[List[Allergen]] = []
     meal_types: Optional[List[MealType]] = []
+    rating_count: int = 0
+    average_rating: Optional[float] = None
+    rating_histogram: List[int] = [0, 0, 0, 0, 0]
 
     class Config:
         from_attributes = True
@@ -114,7 +131,7 @@ class OrderBase(BaseModel):
     order_date: Optional[datetime] = None
 
 class OrderCreate(OrderBase):
-    subscription_weeks: Optional[int] = Field(None, ge=1, le=3)  # For subscriptions, max 3 weeks
+    subscription_weeks: Optional[int] = Field(None, ge=1, le=18)  # For subscriptions, up to a school term
 
 class DishInfo(BaseModel):
     id: int
@@ -137,23 +154,84 @@ class Order(OrderBase):
     is_received: bool
     created_at: datetime
     order_date: Optional[datetime] = None
+    service_date: Optional[date] = None
+    subscription_id: Optional[int] = None
+    dish: Optional[DishInfo] = None
+
+    @computed_field
+    @property
+    def receive_token(self) -> str:
+        """Токен для QR-кода, по которому повар отмечает выдачу"""
+        return auth.create_receive_token(self.id)
+
+    class Config:
+        from_attributes = True
+
+class UpcomingOrder(OrderBase):
+    """Предстоящий заказ по абонементу, строка в orders для него еще не создана"""
+    id: Optional[int] = None
+    student_id: int
+    subscription_id: int
+    is_received: bool = False
+    is_planned: bool = True
+    created_at: datetime
+    service_date: date
     dish: Optional[DishInfo] = None
 
     class Config:
         from_attributes = True
 
+class CartItem(BaseModel):
+    dish_id: int
+    order_date: Optional[datetime] = None
+
+class CartCreate(BaseModel):
+    """Корзина разовых заказов: оплачивается одним списанием"""
+    items: List[CartItem] = Field(..., min_length=1, max_length=50)
+
+class CartLineResult(BaseModel):
+    index: int
+    dish_id: int
+    order_date: Optional[datetime] = None
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+
+class CartResult(BaseModel):
+    orders: List[Order] = []
+    lines: List[CartLineResult]
+    total_cost: float = 0.0
+
 class OrderWithStudent(OrderBase):
     id: int
     student_id: int
     is_received: bool
     created_at: datetime
     order_date: Optional[datetime] = None
+    service_date: Optional[date] = None
     dish: Optional[DishInfo] = None
     student: Optional[StudentInfo] = None
 
     class Config:
         from_attributes = True
 
+class OrderReceiveBatch(BaseModel):
+    """Заказы для отметки о выдаче: id и/или токены из QR-кодов"""
+    order_ids: List[int] = Field([], max_length=500)
+    tokens: List[str] = Field([], max_length=500)
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.order_ids and not self.tokens:
+            raise ValueError("Укажите order_ids или tokens")
+        return self
+
+class OrderReceiveBatchResult(BaseModel):
+    received: List[int]
+    already_received: List[int]
+    not_today: List[int]
+    not_found: List[int]
+    invalid_tokens: List[str] = []
+
 # Схемы для заявок на закупку
 class PurchaseRequestBase(BaseModel):
     item_name: str
@@ -189,6 +267,22 @@ class BalanceTopupRequestUpdate(BaseModel):
     admin_comment: Optional[str] = None
 
 
+class BalanceTopupBatchUpdate(BaseModel):
+    """Массовое решение по ожидающим заявкам: по списку id и/или по правилу"""
+    status: str = Field(..., pattern="^(approved|rejected)$")
+    ids: Optional[List[int]] = Field(None, max_length=1000)
+    max_amount: Optional[float] = Field(None, gt=0)
+    parallel: Optional[str] = None
+    admin_comment: Optional[str] = None
+
+
+class BalanceTopupBatchResult(BaseModel):
+    status: str
+    updated_ids: List[int]
+    students_credited: int
+    total_amount: float
+
+
 class BalanceTopupRequest(BalanceTopupRequestBase):
     id: int
     student_id: int
@@ -214,6 +308,7 @@ class ReviewCreate(ReviewBase):
 class Review(ReviewBase):
     id: int
     student_id: int
+    created_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -233,10 +328,50 @@ class Allergen(AllergenBase):
         from_attributes = True
 
 # Схемы для статистики
+class PaymentBreakdownItem(BaseModel):
+    key: str
+    label: Optional[str] = None
+    revenue: float
+    orders_count: int
+    average_order_value: float
+
 class PaymentStatistics(BaseModel):
     total_revenue: float
     orders_count: int
     average_order_value: float
+    group_by: Optional[str] = None
+    breakdown: Optional[List[PaymentBreakdownItem]] = None
+
+class BalanceMismatch(BaseModel):
+    student_id: int
+    balance: float
+    ledger_balance: float
+    difference: float
+
+class BalanceReconciliation(BaseModel):
+    """Сверка users.balance с журналом движения средств"""
+    users_checked: int
+    total_balance: float
+    total_ledger_balance: float
+    mismatches: List[BalanceMismatch]
+
+class ProductionPlanItem(BaseModel):
+    meal_type: Optional[str] = None
+    dish_id: int
+    dish_name: str
+    stock_quantity: int
+    ordered: int
+    received: int
+    planned: int  # заказы по абонементам, еще не созданные на этот день
+    remaining: int
+
+class ProductionPlan(BaseModel):
+    """Сколько порций выдать за день, по блюдам и приемам пищи"""
+    service_date: date
+    items: List[ProductionPlanItem]
+    total_ordered: int
+    total_received: int
+    total_remaining: int
 
 class AttendanceStatistics(BaseModel):
     unique_users: int
@@ -0,0 +1,27 @@
+"""Часовой пояс школы и расчет дня обслуживания заказов"""
+from datetime import date, datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+import os
+
+SCHOOL_TIMEZONE = os.getenv("SCHOOL_TIMEZONE", "Europe/Moscow")
+SCHOOL_TZ = ZoneInfo(SCHOOL_TIMEZONE)
+
+
+def school_now() -> datetime:
+    """Текущее время в часовом поясе школы"""
+    return datetime.now(SCHOOL_TZ)
+
+
+def school_today() -> date:
+    """Текущая дата в часовом поясе школы"""
+    return school_now().date()
+
+
+def service_date_for(moment: Optional[datetime]) -> date:
+    """День обслуживания для даты заказа; время без пояса считается школьным"""
+    if moment is None:
+        return school_today()
+    if moment.tzinfo is None:
+        return moment.date()
+    return moment.astimezone(SCHOOL_TZ).date()
@@ -1,5 +1,8 @@
 from sqlalchemy.orm import Session
 from . import models, auth
+from .crud import allergen_crud, ledger_crud, review_crud, stats_crud
+from .school_time import service_date_for
+from .menu_cache import menu_cache
 from datetime import datetime, timedelta
 import random
 
@@ -138,6 +141,7 @@ def seed_database(db: Session):
                 if allergen_name in created_allergens:
                     user_allergens.append(created_allergens[allergen_name])
             db_user.allergens_rel = user_allergens
+            db_user.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in user_allergens)
             db.commit()
             db.refresh(db_user)
         
@@ -186,6 +190,7 @@ def seed_database(db: Session):
                 if allergen_name in created_allergens:
                     dish_allergens.append(created_allergens[allergen_name])
             db_dish.allergens_rel = dish_allergens
+            db_dish.allergen_mask = allergen_crud.allergen_mask(allergen.id for allergen in dish_allergens)
             db.commit()
             db.refresh(db_dish)
 
@@ -218,11 +223,14 @@ def seed_database(db: Session):
                 second=random.randint(0, 59)
             )
             
+            scheduled_date = datetime.now()
             db_order = models.Order(
                 student_id=student.id,
                 dish_id=dish.id,
-                order_date=datetime.now(),  # Use order_date for the scheduled date
+                order_date=scheduled_date,  # Use order_date for the scheduled date
+                service_date=service_date_for(scheduled_date),
                 payment_type=random.choice(payment_types),
+                price=dish.price,
                 is_received=random.choice([True, False]),
                 created_at=order_date  # Keep created_at for when the order was placed
             )
@@ -234,6 +242,9 @@ def seed_database(db: Session):
             db.add(db_order)
     
     db.commit()
+    stats_crud.rebuild_daily_order_stats(db)
+    ledger_crud.record_opening_balances(db)
+    menu_cache.invalidate()
     print("Созданы заказы (30 штук)")
     
     # 4. Создаем отзывы
@@ -257,6 +268,7 @@ def seed_database(db: Session):
         db.add(db_review)
     
     db.commit()
+    review_crud.rebuild_dish_ratings(db)
     print("Созданы отзывы (7 штук)")
     
     # 5. Создаем заявки на закупку
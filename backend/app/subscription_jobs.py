@@ -0,0 +1,35 @@
+"""Фоновое создание заказов по абонементам.
+
+GET-запросы заказов только читают: строки orders для абонементов создает
+эта задача (и команда materialize-subscriptions для cron). Каждый воркер
+раз в SUBSCRIPTION_JOB_INTERVAL_SECONDS создает заказы на сегодня и на
+завтра; повторные и одновременные запуски безопасны, потому что
+materialize_subscription_orders идемпотентна на уровне БД.
+SUBSCRIPTION_JOB_INTERVAL_SECONDS=0 отключает задачу (остается только cron).
+"""
+from datetime import timedelta
+import asyncio
+import os
+
+from . import crud
+from .database import run_db, session_scope
+from .school_time import school_today
+
+SUBSCRIPTION_JOB_INTERVAL_SECONDS = float(os.getenv("SUBSCRIPTION_JOB_INTERVAL_SECONDS", 900))
+
+
+async def materialize_upcoming():
+    """Создать заказы по абонементам на сегодня и завтра"""
+    today = school_today()
+    async with session_scope() as db:
+        for service_day in (today, today + timedelta(days=1)):
+            await run_db(db, crud.materialize_subscription_orders, service_day)
+
+
+async def run_periodically():
+    while True:
+        try:
+            await materialize_upcoming()
+        except Exception as error:
+            print(f"Заказы по абонементам не созданы: {error}")
+        await asyncio.sleep(SUBSCRIPTION_JOB_INTERVAL_SECONDS)
@@ -0,0 +1,63 @@
+"""Необязательный прогрев при старте (STARTUP_WARMUP=1).
+
+Без прогрева первые запросы после рестарта или масштабирования платят
+за открытие соединений с БД, построение валидаторов pydantic, первое
+чтение меню и запуск процессов хеширования. Прогрев делает это в
+lifespan до приема запросов. Ошибка прогрева не мешает старту.
+"""
+from contextlib import AsyncExitStack
+from starlette.concurrency import run_in_threadpool
+import os
+import time
+
+from . import crud, hashing, http_cache, schemas
+from .database import DB_POOL_SIZE, async_engine, engine, run_db, session_scope, type_adapter
+from .menu_cache import menu_cache
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Схемы самых частых списков: их TypeAdapter строится заранее
+WARM_SCHEMAS = [
+    list[schemas.Dish],
+    list[schemas.OrderWithStudent],
+    list[schemas.Order],
+    list[schemas.Allergen],
+]
+
+
+def _open_sync_connections():
+    connections = [engine.connect() for _ in range(DB_POOL_SIZE)]
+    for connection in connections:
+        connection.close()
+
+
+async def _open_connections():
+    """Открыть DB_POOL_SIZE соединений разом и вернуть их в пул"""
+    await run_in_threadpool(_open_sync_connections)
+    if async_engine is not None:
+        async with AsyncExitStack() as stack:
+            for _ in range(DB_POOL_SIZE):
+                await stack.enter_async_context(async_engine.connect())
+
+
+async def _prime_menu_cache():
+    """Положить в кэш меню без фильтров (так его видят /chef/dishes и ученики без аллергенов)"""
+    async with session_scope() as db:
+        version = menu_cache.version
+        dishes = await run_db(db, crud.get_dishes, response_model=list[schemas.Dish])
+    cached = dishes, http_cache.content_etag(dishes, list[schemas.Dish])
+    menu_cache.put(menu_cache.make_key(None, None, 0, 100), cached, version)
+
+
+async def warm_up():
+    started = time.perf_counter()
+    try:
+        for response_model in WARM_SCHEMAS:
+            type_adapter(response_model)
+        await _open_connections()
+        await _prime_menu_cache()
+        await hashing.warm_up()
+    except Exception as error:
+        print(f"Прогрев прерван: {error}")
+        return
+    print(f"Прогрев завершен за {time.perf_counter() - started:.2f} с")
@@ -0,0 +1,121 @@
+"""Нагрузочный замер: запросы в секунду для GET /menu и POST /orders.
+
+Сравнивает синхронный и асинхронный режимы БД. Оба сервера запускаются
+заранее на заполненной базе (POST /seed), например:
+
+    uvicorn app.main:app --port 8000
+    DB_ASYNC_MODE=1 uvicorn app.main:app --port 8001
+
+    python benchmarks/bench_async.py \\
+        --target sync=http://localhost:8000 --target async=http://localhost:8001
+
+Используется только стандартная библиотека, чтобы скрипт не тянул
+зависимостей в образ.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+STUDENT = ("student1@school.ru", "password123")
+ADMIN = ("admin@school.ru", "adminpass123")
+
+
+class Client:
+    """Keep-alive HTTP-клиент, по одному на поток"""
+
+    def __init__(self, base_url: str, token: str | None = None):
+        parts = urlsplit(base_url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.token = token
+
+    def request(self, method: str, path: str, body: dict | None = None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        payload = json.dumps(body) if body is not None else None
+        self.conn.request(method, path, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+
+def login(base_url: str, credentials: tuple[str, str]) -> str:
+    status, data = Client(base_url).request(
+        "POST", "/login", {"email": credentials[0], "password": credentials[1]}
+    )
+    if status != 200:
+        raise SystemExit(f"{base_url}: не удалось войти как {credentials[0]} ({status})")
+    return data["access_token"]
+
+
+def prepare(base_url: str, orders_expected: int):
+    """Пополняет баланс ученика и остаток блюда, чтобы заказы не упирались в лимиты"""
+    student_token = login(base_url, STUDENT)
+    admin = Client(base_url, login(base_url, ADMIN))
+    student = Client(base_url, student_token)
+
+    _, menu = student.request("GET", "/menu?exclude_allergens=false")
+    dish = min(menu, key=lambda d: d["price"])
+
+    _, topup = student.request("POST", "/me/balance/topup", {"amount": dish["price"] * orders_expected})
+    admin.request("PATCH", f"/admin/balance-topup-requests/{topup['id']}", {"status": "approved"})
+    admin.request("PATCH", f"/admin/dishes/{dish['id']}",
+                  {"stock_quantity": dish["stock_quantity"] + orders_expected})
+    return student_token, dish["id"]
+
+
+def run_load(base_url: str, token: str, method: str, path: str, body: dict | None,
+             concurrency: int, duration: float):
+    stop_at = time.perf_counter() + duration
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(base_url, token)
+        ok = errors = 0
+        while time.perf_counter() < stop_at:
+            status, _ = client.request(method, path, body)
+            if status < 400:
+                ok += 1
+            else:
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+    return counts["ok"] / elapsed, counts["errors"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", required=True,
+                        help="метка=URL, например sync=http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0, help="секунд на каждый сценарий")
+    args = parser.parse_args()
+
+    print(f"{'режим':<10} {'сценарий':<14} {'req/s':>10} {'ошибок':>8}")
+    for target in args.target:
+        label, base_url = target.split("=", 1)
+        token, dish_id = prepare(base_url, orders_expected=100_000)
+
+        scenarios = [
+            ("GET /menu", "GET", "/menu", None),
+            ("POST /orders", "POST", "/orders", {"dish_id": dish_id, "payment_type": "one-time"}),
+        ]
+        for name, method, path, body in scenarios:
+            rps, errors = run_load(base_url, token, method, path, body, args.concurrency, args.duration)
+            print(f"{label:<10} {name:<14} {rps:>10.1f} {errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Замер пропускной способности входа: проверок пароля в секунду.
+
+Проверка пароля Argon2 - основная работа POST /login, поэтому скрипт
+гоняет ее в пуле процессов, как app/hashing.py, для каждого сочетания
+размера пула и параметров Argon2 и печатает таблицу:
+
+    python benchmarks/bench_hashing.py --workers 1 2 4 \\
+        --time-cost 2 3 --memory-cost 19456 102400 --duration 5
+
+Помимо пропускной способности выводится p95 задержки одной проверки
+при заданном числе одновременных запросов (--concurrency).
+"""
+import argparse
+import itertools
+import multiprocessing
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+PASSWORD = "password123"
+
+_contexts = {}
+
+
+def _context(time_cost: int, memory_cost: int, parallelism: int) -> CryptContext:
+    key = (time_cost, memory_cost, parallelism)
+    if key not in _contexts:
+        _contexts[key] = CryptContext(
+            schemes=["argon2"],
+            argon2__time_cost=time_cost,
+            argon2__memory_cost=memory_cost,
+            argon2__parallelism=parallelism
+        )
+    return _contexts[key]
+
+
+def _hash(params: tuple) -> str:
+    return _context(*params).hash(PASSWORD)
+
+
+def _verify(params: tuple, hashed: str) -> bool:
+    return _context(*params).verify(PASSWORD, hashed)
+
+
+def run(workers: int, params: tuple, concurrency: int, duration: float) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        hashed = pool.submit(_hash, params).result()
+        # Прогрев: каждый процесс пула импортирует passlib и строит контекст
+        list(pool.map(_verify, [params] * workers, [hashed] * workers))
+
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                pool.submit(_verify, params, hashed).result()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "verifies_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Размеры пула (HASH_WORKERS)")
+    parser.add_argument("--time-cost", type=int, nargs="+", default=[2], help="ARGON2_TIME_COST")
+    parser.add_argument("--memory-cost", type=int, nargs="+", default=[102400], help="ARGON2_MEMORY_COST, КиБ")
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[8], help="ARGON2_PARALLELISM")
+    parser.add_argument("--concurrency", type=int, default=32, help="Одновременных входов")
+    parser.add_argument("--duration", type=float, default=5.0, help="Секунд на один замер")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'time':>5} {'memory':>8} {'par':>4} {'login/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for workers, time_cost, memory_cost, parallelism in itertools.product(
+        args.workers, args.time_cost, args.memory_cost, args.parallelism
+    ):
+        result = run(workers, (time_cost, memory_cost, parallelism), args.concurrency, args.duration)
+        print(
+            f"{workers:>7} {time_cost:>5} {memory_cost:>8} {parallelism:>4} "
+            f"{result['verifies_per_second']:>9.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
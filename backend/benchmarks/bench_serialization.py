@@ -0,0 +1,88 @@
+"""Микробенчмарк сериализации списков заказов: обычный путь против FAST_JSON_RESPONSES.
+
+Обычный путь повторяет то, что делает роут с response_model: run_db
+валидирует ORM-объекты в схемы, затем FastAPI валидирует результат еще
+раз, переводит его в dict/list и сериализует стандартным json. Быстрый
+путь (app/fast_json.py) после run_db сразу вызывает TypeAdapter.dump_json.
+
+БД не нужна: заказы собираются в памяти как объекты с атрибутами.
+
+    python benchmarks/bench_serialization.py --orders 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import schemas  # noqa: E402
+
+
+def make_orders(count: int) -> list:
+    dishes = [SimpleNamespace(id=i, name=f"Блюдо {i}", price=100.0 + i) for i in range(1, 13)]
+    students = [SimpleNamespace(id=i, full_name=f"Ученик {i}") for i in range(1, 501)]
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            dish_id=dishes[i % len(dishes)].id,
+            student_id=students[i % len(students)].id,
+            payment_type="one-time" if i % 3 else "subscription",
+            order_date=now,
+            service_date=date.today(),
+            is_received=bool(i % 2),
+            created_at=now,
+            dish=dishes[i % len(dishes)],
+            student=students[i % len(students)]
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def default_path(adapter: TypeAdapter, rows: list) -> bytes:
+    validated = adapter.validate_python(rows, from_attributes=True)
+    # serialize_response в FastAPI: повторная валидация и перевод в python-объекты
+    content = adapter.dump_python(adapter.validate_python(validated), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_path(adapter: TypeAdapter, rows: list) -> bytes:
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+def measure(fn, adapter: TypeAdapter, rows: list, repeat: int) -> dict:
+    fn(adapter, rows)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(adapter, rows)
+        timings.append(time.perf_counter() - started)
+    return {"median_ms": statistics.median(timings) * 1000, "min_ms": min(timings) * 1000, "bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10000, help="Заказов в ответе")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов на путь")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(list[schemas.OrderWithStudent])
+    rows = make_orders(args.orders)
+    print(f"{'path':>8} {'median ms':>10} {'min ms':>8} {'bytes':>10}")
+    results = {}
+    for name, fn in (("default", default_path), ("fast", fast_path)):
+        results[name] = measure(fn, adapter, rows, args.repeat)
+        result = results[name]
+        print(f"{name:>8} {result['median_ms']:>10.1f} {result['min_ms']:>8.1f} {result['bytes']:>10}")
+    print(f"ускорение: x{results['default']['median_ms'] / results['fast']['median_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Замер холодного старта: время импорта app.main и задержка первых запросов.
+
+Для каждого прогона запускается отдельный процесс uvicorn, и замеряется:
+- import: время импорта app.main в чистом интерпретаторе;
+- ready: от запуска процесса до первого ответа GET /health;
+- first: первый запрос к БД (GET /allergens) и повторный такой же.
+
+Схема БД должна быть создана заранее (python -m app.commands migrate).
+Запуск из каталога backend с теми же переменными окружения, что и у сервера:
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 5 --warmup   # со STARTUP_WARMUP=1
+
+Используется только стандартная библиотека.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def measure_import() -> float:
+    code = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def get(port: int, path: str) -> int:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def timed_get(port: int, path: str) -> float:
+    started = time.perf_counter()
+    status = get(port, path)
+    if status != 200:
+        raise SystemExit(f"GET {path}: {status}")
+    return time.perf_counter() - started
+
+
+def measure_server(port: int, warmup: bool, timeout: float) -> dict:
+    env = dict(os.environ, STARTUP_WARMUP="1" if warmup else "0")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise SystemExit("uvicorn завершился до готовности")
+            try:
+                if get(port, "/health") == 200:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - started > timeout:
+                raise SystemExit("uvicorn не ответил вовремя")
+            time.sleep(0.01)
+        ready = time.perf_counter() - started
+        return {
+            "ready": ready,
+            "first": timed_get(port, "/allergens"),
+            "second": timed_get(port, "/allergens"),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Число холодных стартов")
+    parser.add_argument("--port", type=int, default=8010, help="Порт временного сервера")
+    parser.add_argument("--warmup", action="store_true", help="Запускать сервер со STARTUP_WARMUP=1")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Секунд ожидания готовности")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_server(args.port, args.warmup, args.timeout) for _ in range(args.runs)]
+
+    print(f"{'metric':>8} {'median ms':>10} {'max ms':>8}")
+    rows = [("import", imports)] + [(key, [run[key] for run in servers]) for key in ("ready", "first", "second")]
+    for name, values in rows:
+        print(f"{name:>8} {statistics.median(values) * 1000:>10.1f} {max(values) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
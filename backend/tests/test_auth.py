@@ -0,0 +1,31 @@
+"""Кэш версий токена в памяти процесса."""
+
+
+def test_token_state_cache_evicts_oldest(monkeypatch):
+    from collections import OrderedDict
+    from app import auth
+
+    monkeypatch.setattr(auth, "_token_states", OrderedDict())
+    monkeypatch.setattr(auth, "TOKEN_STATE_CACHE_SIZE", 2)
+
+    auth.remember_token_state(1, 0, True)
+    auth.remember_token_state(2, 0, True)
+    assert auth.cached_token_state(1) == (0, True)
+    auth.remember_token_state(3, 1, False)
+
+    # Пользователь 2 не запрашивался дольше всех и вытеснен
+    assert auth.cached_token_state(2) is None
+    assert auth.cached_token_state(1) == (0, True)
+    assert auth.cached_token_state(3) == (1, False)
+
+
+def test_token_state_cache_drops_expired(monkeypatch):
+    from collections import OrderedDict
+    from app import auth
+
+    monkeypatch.setattr(auth, "_token_states", OrderedDict())
+    monkeypatch.setattr(auth, "TOKEN_STATE_TTL_SECONDS", 0)
+
+    auth.remember_token_state(1, 0, True)
+    assert auth.cached_token_state(1) is None
+    assert len(auth._token_states) == 0
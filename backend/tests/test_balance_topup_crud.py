@@ -0,0 +1,96 @@
+"""Зачисление одобренных заявок на пополнение (нужен TEST_DATABASE_URL, см. conftest.py)."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _ledger_total(db, student_id: int) -> float:
+    from sqlalchemy import func
+    from app import models
+
+    return db.query(func.coalesce(func.sum(models.BalanceLedgerEntry.amount), 0.0)).filter(
+        models.BalanceLedgerEntry.student_id == student_id
+    ).scalar()
+
+
+def test_approving_twice_credits_once(db, make_student):
+    from app.crud import balance_topup_crud
+
+    student = make_student()
+    request = balance_topup_crud.create_topup_request(db, student.id, 300.0)
+
+    balance_topup_crud.update_topup_request_status(db, request.id, "approved")
+    balance_topup_crud.update_topup_request_status(db, request.id, "approved")
+
+    db.refresh(student)
+    assert student.balance == 300.0
+    assert _ledger_total(db, student.id) == 300.0
+
+
+def test_parallel_approvals_credit_once(engine, db, make_student):
+    from sqlalchemy.orm import sessionmaker
+    from app.crud import balance_topup_crud
+
+    Session = sessionmaker(bind=engine)
+    student = make_student()
+    request_id = balance_topup_crud.create_topup_request(db, student.id, 300.0).id
+
+    def approve(_):
+        with Session() as session:
+            balance_topup_crud.update_topup_request_status(session, request_id, "approved")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(approve, range(8)))
+
+    db.refresh(student)
+    assert student.balance == 300.0
+    assert _ledger_total(db, student.id) == 300.0
+
+
+def test_batch_approve_credits_matching_pending_requests(db, make_student):
+    from app import models
+    from app.crud import balance_topup_crud
+
+    first = make_student()
+    second = make_student()
+    small = balance_topup_crud.create_topup_request(db, first.id, 100.0).id
+    another_small = balance_topup_crud.create_topup_request(db, first.id, 50.0).id
+    large = balance_topup_crud.create_topup_request(db, second.id, 1000.0).id
+    rejected = balance_topup_crud.create_topup_request(db, second.id, 10.0).id
+    balance_topup_crud.update_topup_request_status(db, rejected, "rejected")
+
+    result = balance_topup_crud.batch_update_topup_requests(db, "approved", max_amount=500.0)
+
+    assert result["updated_ids"] == sorted([small, another_small])
+    assert result["students_credited"] == 1
+    assert result["total_amount"] == 150.0
+    db.refresh(first)
+    db.refresh(second)
+    assert first.balance == 150.0
+    assert second.balance == 0.0
+    assert _ledger_total(db, first.id) == 150.0
+    assert db.get(models.BalanceTopupRequest, large).status == "pending"
+    assert db.get(models.BalanceTopupRequest, rejected).status == "rejected"
+
+    # Уже одобренные заявки повторно не зачисляются
+    again = balance_topup_crud.batch_update_topup_requests(db, "approved", ids=[small, large])
+    assert again["updated_ids"] == [large]
+    db.refresh(first)
+    assert first.balance == 150.0
+
+
+def test_batch_reject_does_not_credit(db, make_student):
+    from app import models
+    from app.crud import balance_topup_crud
+
+    student = make_student()
+    request_id = balance_topup_crud.create_topup_request(db, student.id, 100.0).id
+
+    result = balance_topup_crud.batch_update_topup_requests(
+        db, "rejected", ids=[request_id], admin_comment="Нет чека"
+    )
+
+    assert result["updated_ids"] == [request_id]
+    assert result["students_credited"] == 0
+    db.refresh(student)
+    assert student.balance == 0.0
+    request = db.get(models.BalanceTopupRequest, request_id)
+    assert (request.status, request.admin_comment) == ("rejected", "Нет чека")
@@ -0,0 +1,63 @@
+"""Массовая отметка выдачи mark_orders_received (нужен TEST_DATABASE_URL, см. conftest.py)."""
+from datetime import timedelta
+
+
+def _add_orders(db, student, dish, service_date, count: int = 1, is_received: bool = False) -> list:
+    from app import models
+
+    orders = [
+        models.Order(
+            student_id=student.id,
+            dish_id=dish.id,
+            service_date=service_date,
+            payment_type="one-time",
+            is_received=is_received
+        )
+        for _ in range(count)
+    ]
+    db.add_all(orders)
+    db.commit()
+    return [order.id for order in orders]
+
+
+def test_bulk_receive_classifies_ids(db, make_student, make_dish):
+    from app import models
+    from app.crud import order_crud
+    from app.school_time import school_today
+
+    student = make_student()
+    dish = make_dish()
+    today = school_today()
+    pending = _add_orders(db, student, dish, today, count=2)
+    received = _add_orders(db, student, dish, today, is_received=True)
+    tomorrow = _add_orders(db, student, dish, today + timedelta(days=1))
+    missing = max(pending + received + tomorrow) + 1000
+
+    result = order_crud.mark_orders_received(db, pending + received + tomorrow + [missing, pending[0]])
+
+    assert result == {
+        "received": pending,
+        "already_received": received,
+        "not_today": tomorrow,
+        "not_found": [missing]
+    }
+    db.expire_all()
+    assert all(db.get(models.Order, order_id).is_received for order_id in pending)
+    assert not db.get(models.Order, tomorrow[0]).is_received
+
+    # Повтор той же пачки ничего не меняет
+    again = order_crud.mark_orders_received(db, pending)
+    assert again["received"] == []
+    assert again["already_received"] == pending
+
+
+def test_bulk_receive_large_batch(db, make_student, make_dish):
+    from app.crud import order_crud
+    from app.school_time import school_today
+
+    # Больше id, чем помещается в один NOTIFY
+    order_ids = _add_orders(db, make_student(), make_dish(), school_today(), count=2000)
+
+    result = order_crud.mark_orders_received(db, order_ids)
+
+    assert result["received"] == sorted(order_ids)
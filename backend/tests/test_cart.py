@@ -0,0 +1,55 @@
+"""Построчные ошибки корзины create_cart_orders (нужен TEST_DATABASE_URL, см. conftest.py)."""
+
+
+def _cart(*dish_ids):
+    from app import schemas
+
+    return [schemas.CartItem(dish_id=dish_id) for dish_id in dish_ids]
+
+
+def test_cart_rejects_lines_individually(db, make_student, make_dish):
+    from app import models
+    from app.crud import allergen_crud, order_crud
+
+    allergen = models.Allergen(name="Молоко")
+    student = make_student(balance=500.0)
+    available = make_dish(price=100.0, stock_quantity=5, name="Каша")
+    last_one = make_dish(price=50.0, stock_quantity=1, name="Суп")
+    allergic = make_dish(price=70.0, stock_quantity=5, name="Сырники")
+    allergic.allergens_rel.append(allergen)
+    student.allergens_rel.append(allergen)
+    db.flush()
+    allergic.allergen_mask = student.allergen_mask = allergen_crud.allergen_mask([allergen.id])
+    db.commit()
+
+    result = order_crud.create_cart_orders(
+        db, _cart(available.id, 999999, last_one.id, last_one.id, allergic.id), student.id
+    )
+
+    errors = [line["error"] for line in result["lines"]]
+    assert errors == [None, "Блюдо не найдено", None, "Блюдо закончилось", "Блюдо содержит ваши аллергены"]
+    assert [line["order_id"] is not None for line in result["lines"]] == [True, False, True, False, False]
+    assert result["total_cost"] == 150.0
+    assert len(result["orders"]) == 2
+
+    db.refresh(student)
+    assert student.balance == 350.0
+    assert db.get(models.Dish, last_one.id).stock_quantity == 0
+
+
+def test_cart_without_funds_creates_nothing(db, make_student, make_dish):
+    from app import models
+    from app.crud import order_crud
+
+    student = make_student(balance=120.0)
+    first = make_dish(price=100.0, stock_quantity=5)
+    second = make_dish(price=50.0, stock_quantity=5)
+
+    result = order_crud.create_cart_orders(db, _cart(first.id, second.id), student.id)
+
+    assert result["orders"] == []
+    assert [line["error"] for line in result["lines"]] == ["Недостаточно средств"] * 2
+    db.refresh(student)
+    assert student.balance == 120.0
+    assert db.get(models.Dish, first.id).stock_quantity == 5
+    assert db.query(models.Order).count() == 0
@@ -0,0 +1,25 @@
+"""Снимки балансов по журналу (нужен TEST_DATABASE_URL, см. conftest.py)."""
+
+
+def test_snapshot_skips_recent_entries(db, make_student, monkeypatch):
+    from app import models
+    from app.crud import ledger_crud
+
+    student = make_student(balance=0.0)
+    ledger_crud.record_entries(db, [{"student_id": student.id, "amount": 100.0, "kind": "topup"}])
+    db.commit()
+
+    # Свежие записи ждут следующего снимка
+    assert ledger_crud.take_balance_snapshots(db) == 0
+
+    monkeypatch.setattr(ledger_crud, "BALANCE_SNAPSHOT_LAG_SECONDS", 0)
+    assert ledger_crud.take_balance_snapshots(db) == 1
+    ledger_crud.record_entries(db, [{"student_id": student.id, "amount": -30.0, "kind": "order"}])
+    db.query(models.User).filter(models.User.id == student.id).update({"balance": 70.0})
+    db.commit()
+
+    snapshot = db.get(models.BalanceSnapshot, student.id)
+    assert snapshot.balance == 100.0
+    report = ledger_crud.reconcile_balances(db)
+    assert report["mismatches"] == []
+    assert report["total_ledger_balance"] == 70.0
@@ -0,0 +1,88 @@
+"""Условные списания остатка и баланса в create_order (нужен TEST_DATABASE_URL, см. conftest.py)."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _order(dish_id: int, **kwargs):
+    from app import schemas
+
+    return schemas.OrderCreate(dish_id=dish_id, payment_type="one-time", **kwargs)
+
+
+def test_create_order_charges_stock_and_balance(db, make_student, make_dish):
+    from app.crud import order_crud
+
+    student = make_student(balance=250.0)
+    dish = make_dish(price=100.0, stock_quantity=2)
+
+    assert order_crud.create_order(db, _order(dish.id), student.id)
+
+    db.refresh(student)
+    db.refresh(dish)
+    assert student.balance == 150.0
+    assert dish.stock_quantity == 1
+
+
+def test_create_order_rejects_missing_stock(db, make_student, make_dish):
+    from app.crud import order_crud
+
+    student = make_student(balance=250.0)
+    dish = make_dish(stock_quantity=0)
+
+    assert order_crud.create_order(db, _order(dish.id), student.id) is None
+
+    db.refresh(student)
+    assert student.balance == 250.0
+
+
+def test_create_order_rejects_low_balance_and_keeps_stock(db, make_student, make_dish):
+    from app.crud import order_crud
+
+    student = make_student(balance=50.0)
+    dish = make_dish(price=100.0, stock_quantity=2)
+
+    assert order_crud.create_order(db, _order(dish.id), student.id) is None
+
+    db.refresh(student)
+    db.refresh(dish)
+    assert student.balance == 50.0
+    # Списание остатка откатывается вместе с неудачным списанием баланса
+    assert dish.stock_quantity == 2
+
+
+def test_parallel_orders_never_oversell(engine, db, make_student, make_dish):
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+    from app.crud import order_crud
+
+    Session = sessionmaker(bind=engine)
+    students = [make_student(balance=100.0) for _ in range(8)]
+    dish = make_dish(price=100.0, stock_quantity=3)
+    dish_id = dish.id
+
+    def place(student_id):
+        with Session() as session:
+            return order_crud.create_order(session, _order(dish_id), student_id) is not None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(place, [student.id for student in students]))
+
+    assert results.count(True) == 3
+    db.expire_all()
+    assert db.get(models.Dish, dish_id).stock_quantity == 0
+    assert db.query(models.Order).count() == 3
+    assert sum(db.get(models.User, student.id).balance for student in students) == 500.0
+
+
+def test_menu_cache_reset_only_when_dish_sells_out(db, make_student, make_dish):
+    from app.crud import order_crud
+    from app.menu_cache import menu_cache
+
+    student = make_student(balance=1000.0)
+    dish = make_dish(price=100.0, stock_quantity=2)
+
+    version = menu_cache.version
+    assert order_crud.create_order(db, _order(dish.id), student.id)
+    assert menu_cache.version == version
+
+    assert order_crud.create_order(db, _order(dish.id), student.id)
+    assert menu_cache.version == version + 1
@@ -0,0 +1,30 @@
+"""Пересчет агрегатов оценок на настоящей PostgreSQL (нужен TEST_DATABASE_URL, см. conftest.py)."""
+
+
+def test_rebuild_dish_ratings(db):
+    from app import models
+    from app.crud import review_crud
+
+    student = models.User(email="s@school.ru", full_name="Ученик", parallel="9", hashed_password="x")
+    reviewed = models.Dish(name="Каша", price=50.0)
+    # Агрегаты без отзывов должны обнулиться
+    stale = models.Dish(name="Суп", price=80.0, rating_count=3, rating_sum=12, rating_4=3)
+    db.add_all([student, reviewed, stale])
+    db.flush()
+    db.add_all([
+        models.Review(student_id=student.id, dish_id=reviewed.id, rating=rating)
+        for rating in (5, 5, 3, 1)
+    ])
+    db.commit()
+
+    updated = review_crud.rebuild_dish_ratings(db)
+
+    assert updated == 1
+    db.refresh(reviewed)
+    db.refresh(stale)
+    assert reviewed.rating_count == 4
+    assert reviewed.rating_sum == 14
+    assert reviewed.rating_histogram == [1, 0, 1, 0, 2]
+    assert stale.rating_count == 0
+    assert stale.rating_sum == 0
+    assert stale.rating_histogram == [0, 0, 0, 0, 0]
@@ -0,0 +1,23 @@
+"""Сводная статистика заказов (нужен TEST_DATABASE_URL, см. conftest.py)."""
+
+
+def test_stats_use_paid_price_and_attendance_rollup(db, make_student, make_dish):
+    from app import schemas
+    from app.crud import order_crud, stats_crud
+
+    first = make_student(balance=1000.0)
+    second = make_student(balance=1000.0)
+    dish = make_dish(price=100.0)
+    for student in (first, first, second):
+        order = schemas.OrderCreate(dish_id=dish.id, payment_type="one-time")
+        assert order_crud.create_order(db, order, student.id)
+
+    # Новая цена блюда не меняет выручку по уже оплаченным заказам
+    dish.price = 250.0
+    db.commit()
+    stats_crud.rebuild_daily_order_stats(db)
+
+    payments = stats_crud.get_payment_statistics(db)
+    assert (payments["total_revenue"], payments["orders_count"]) == (300.0, 3)
+    attendance = stats_crud.get_attendance_statistics(db)
+    assert (attendance["unique_users"], attendance["total_orders"]) == (2, 3)
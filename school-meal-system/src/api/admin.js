@@ -79,6 +79,25 @@ export const adminApi = {
     return handleResponse(response);
   },
 
+  getPendingCounts: async () => {
+    const response = await fetch(`${API_BASE_URL}/admin/pending-counts`, {
+      headers: getAuthHeaders(),
+    });
+    return handleResponse(response);
+  },
+
+  batchUpdateBalanceTopupRequests: async (batch) => {
+    const response = await fetch(
+      `${API_BASE_URL}/admin/balance-topup-requests/batch`,
+      {
+        method: "POST",
+        headers: getAuthHeaders(),
+        body: JSON.stringify(batch),
+      },
+    );
+    return handleResponse(response);
+  },
+
   createDish: async (dishData) => {
     const response = await fetch(`${API_BASE_URL}/admin/dishes`, {
       method: "POST",
@@ -15,6 +15,24 @@ export const chefApi = {
     return handleResponse(response);
   },
 
+  // Живая лента заказов на сегодня (SSE). Возвращает функцию отписки
+  subscribeTodayOrders: (onSnapshot, onOrders) => {
+    const token = encodeURIComponent(localStorage.getItem("token") || "");
+    const source = new EventSource(
+      `${API_BASE_URL}/chef/orders/stream?token=${token}`,
+    );
+    source.addEventListener("snapshot", (event) =>
+      onSnapshot(JSON.parse(event.data)),
+    );
+    source.addEventListener("order_created", (event) =>
+      onOrders(JSON.parse(event.data)),
+    );
+    source.addEventListener("order_received", (event) =>
+      onOrders(JSON.parse(event.data)),
+    );
+    return () => source.close();
+  },
+
   getDishesWithStock: async () => {
     const response = await fetch(`${API_BASE_URL}/chef/dishes`, {
       headers: getAuthHeaders(),
@@ -15,5 +15,10 @@ export const handleResponse = async (response) => {
       .catch(() => ({ detail: "Ошибка сервера" }));
     throw new Error(error.detail || "Произошла ошибка");
   }
+  // После смены профиля или пароля сервер выдает новый токен
+  const refreshedToken = response.headers.get("X-Access-Token");
+  if (refreshedToken) {
+    localStorage.setItem("token", refreshedToken);
+  }
   return response.json();
 };
@@ -88,6 +88,25 @@ export const studentApi = {
     return handleResponse(response);
   },
 
+  createCartOrder: async (items) => {
+    const response = await fetch(`${API_BASE_URL}/orders/cart`, {
+      method: "POST",
+      headers: getAuthHeaders(),
+      body: JSON.stringify({
+        items: items.map((item) => ({
+          dish_id: item.dishId,
+          order_date: item.orderDate || null,
+        })),
+      }),
+    });
+    // 400 означает, что ни одна строка не прошла; причины лежат в lines
+    if (response.status === 400) {
+      const data = await response.json().catch(() => null);
+      if (data?.lines) return data;
+    }
+    return handleResponse(response);
+  },
+
   getMyOrders: async () => {
     const response = await fetch(`${API_BASE_URL}/orders/my`, {
       headers: getAuthHeaders(),
@@ -95,6 +114,13 @@ export const studentApi = {
     return handleResponse(response);
   },
 
+  getUpcomingOrders: async () => {
+    const response = await fetch(`${API_BASE_URL}/orders/upcoming`, {
+      headers: getAuthHeaders(),
+    });
+    return handleResponse(response);
+  },
+
   markOrderReceived: async (orderId) => {
     const response = await fetch(`${API_BASE_URL}/orders/${orderId}/receive`, {
       method: "POST",
@@ -1,5 +1,11 @@
 import React from "react";
-import { ShoppingCart, MessageSquare, Croissant, Utensils } from "lucide-react";
+import {
+  ShoppingCart,
+  MessageSquare,
+  Croissant,
+  Utensils,
+  Star,
+} from "lucide-react";
 
 const DishCard = ({
   dish,
@@ -30,6 +36,15 @@ const DishCard = ({
                 ? "Завтрак"
                 : "Обед"}
           </div>
+          {dish.rating_count > 0 && (
+            <div
+              className="flex items-center gap-1 text-xs text-base-content/70"
+              title={`Оценок: ${dish.rating_count}`}
+            >
+              <Star className="h-4 w-4 fill-warning text-warning" />
+              {dish.average_rating.toFixed(1)} ({dish.rating_count})
+            </div>
+          )}
         </div>
         <h3 className="card-title text-sm sm:text-base">{dish.name}</h3>
         <p className="text-base-content/60 text-xs sm:text-sm">
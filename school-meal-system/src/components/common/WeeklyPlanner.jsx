@@ -11,7 +11,13 @@ import {
 import toast from "react-hot-toast";
 import Modal from "./Modal";
 
-const WeeklyPlanner = ({ dishes, balance, onBulkOrder, user }) => {
+const WeeklyPlanner = ({
+  dishes,
+  balance,
+  onBulkOrder,
+  onCartOrder,
+  user,
+}) => {
   const [weekStart, setWeekStart] = useState(() => {
     // Start from Monday of current week
     const today = new Date();
@@ -204,23 +210,44 @@ const WeeklyPlanner = ({ dishes, balance, onBulkOrder, user }) => {
       let successCount = 0;
       let errorCount = 0;
 
-      for (const { dateString, dish } of allMeals) {
-        try {
-          const orderData = {
+      if (paymentType === "one-time" && onCartOrder) {
+        // Разовые заказы уходят одной корзиной: одно списание на всю неделю
+        const result = await onCartOrder(
+          allMeals.map(({ dateString, dish }) => ({
             dishId: dish.id,
-            paymentType: paymentType,
             orderDate: dateString,
-          };
-
-          if (paymentType === "subscription") {
-            orderData.subscriptionWeeks = weeks;
+          })),
+        );
+        result.lines.forEach((line) => {
+          if (line.order_id) {
+            successCount++;
+          } else {
+            console.error(
+              `Error ordering dish #${line.dish_id}:`,
+              line.error,
+            );
+            errorCount++;
+          }
+        });
+      } else {
+        for (const { dateString, dish } of allMeals) {
+          try {
+            const orderData = {
+              dishId: dish.id,
+              paymentType: paymentType,
+              orderDate: dateString,
+            };
+
+            if (paymentType === "subscription") {
+              orderData.subscriptionWeeks = weeks;
+            }
+
+            await onBulkOrder(orderData);
+            successCount++;
+          } catch (error) {
+            console.error(`Error ordering ${dish.name}:`, error);
+            errorCount++;
           }
-
-          await onBulkOrder(orderData);
-          successCount++;
-        } catch (error) {
-          console.error(`Error ordering ${dish.name}:`, error);
-          errorCount++;
         }
       }
 
@@ -22,24 +22,20 @@ const AdminDashboard = () => {
   const { user } = useAuth();
   const [paymentStats, setPaymentStats] = useState(null);
   const [attendanceStats, setAttendanceStats] = useState(null);
-  const [requests, setRequests] = useState([]);
-  const [balanceTopupRequests, setBalanceTopupRequests] = useState([]);
+  const [pendingCounts, setPendingCounts] = useState({});
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [payment, attendance, requestsData, balanceTopupData] =
-          await Promise.all([
-            adminApi.getPaymentStatistics(),
-            adminApi.getAttendanceStatistics(),
-            adminApi.getAllPurchaseRequests(),
-            adminApi.getAllBalanceTopupRequests(),
-          ]);
+        const [payment, attendance, counts] = await Promise.all([
+          adminApi.getPaymentStatistics(),
+          adminApi.getAttendanceStatistics(),
+          adminApi.getPendingCounts(),
+        ]);
         setPaymentStats(payment);
         setAttendanceStats(attendance);
-        setRequests(requestsData);
-        setBalanceTopupRequests(balanceTopupData);
+        setPendingCounts(counts);
       } catch (error) {
         console.error("Error fetching dashboard data:", error);
       } finally {
@@ -49,10 +45,8 @@ const AdminDashboard = () => {
     fetchData();
   }, []);
 
-  const pendingRequests = requests.filter((r) => r.status === "pending").length;
-  const pendingBalanceTopups = balanceTopupRequests.filter(
-    (r) => r.status === "pending",
-  ).length;
+  const pendingRequests = pendingCounts.purchase_requests || 0;
+  const pendingBalanceTopups = pendingCounts.balance_topup_requests || 0;
 
   if (loading) {
     return (
@@ -59,6 +59,29 @@ const BalanceTopupRequestsPage = () => {
     }
   };
 
+  const handleApproveAllPending = async () => {
+    const ids = allRequests
+      .filter((r) => r.status === "pending")
+      .map((r) => r.id);
+    if (ids.length === 0) return;
+
+    setProcessing("batch");
+    try {
+      const result = await adminApi.batchUpdateBalanceTopupRequests({
+        status: "approved",
+        ids,
+      });
+      toast.success(
+        `Одобрено заявок: ${result.updated_ids.length} на ${result.total_amount.toFixed(2)} ₽`,
+      );
+      fetchAllRequests();
+    } catch (error) {
+      toast.error(error.message);
+    } finally {
+      setProcessing(null);
+    }
+  };
+
   const handleRejectClick = (requestId) => {
     setSelectedRequestId(requestId);
     setAdminComment("");
@@ -208,6 +231,18 @@ const BalanceTopupRequestsPage = () => {
             {filterItem.label}
           </button>
         ))}
+        {pendingCount > 0 && (
+          <button
+            className={`btn btn-sm btn-success ml-auto ${
+              processing === "batch" ? "loading" : ""
+            }`}
+            onClick={handleApproveAllPending}
+            disabled={processing !== null}
+          >
+            <CheckCircle className="h-4 w-4" />
+            Одобрить все ожидающие ({pendingCount})
+          </button>
+        )}
       </div>
 
       {/* Requests List */}
@@ -16,6 +16,12 @@ import {
   ChefHat,
 } from "lucide-react";
 
+const orderTime = (order) =>
+  order.order_date ? new Date(order.order_date) : new Date(order.created_at);
+
+const sortOrders = (orders) =>
+  [...orders].sort((a, b) => orderTime(b) - orderTime(a));
+
 const ChefDashboard = () => {
   const { user } = useAuth();
   const [todayOrders, setTodayOrders] = useState([]);
@@ -26,21 +32,10 @@ const ChefDashboard = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [ordersData, dishesData, requestsData] = await Promise.all([
-          chefApi.getTodayOrders(),
+        const [dishesData, requestsData] = await Promise.all([
           chefApi.getDishesWithStock(),
           chefApi.getMyPurchaseRequests(),
         ]);
-        const sortedOrdersData = ordersData.sort((a, b) => {
-          const dateA = a.order_date
-            ? new Date(a.order_date)
-            : new Date(a.created_at);
-          const dateB = b.order_date
-            ? new Date(b.order_date)
-            : new Date(b.created_at);
-          return dateB - dateA;
-        });
-        setTodayOrders(sortedOrdersData);
         setDishes(dishesData);
         setRequests(requestsData);
       } catch (error) {
@@ -52,6 +47,19 @@ const ChefDashboard = () => {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    // Снимок заказов приходит первым событием, затем только изменения
+    return chefApi.subscribeTodayOrders(
+      (orders) => setTodayOrders(sortOrders(orders)),
+      (changed) =>
+        setTodayOrders((current) => {
+          const byId = new Map(current.map((order) => [order.id, order]));
+          changed.forEach((order) => byId.set(order.id, order));
+          return sortOrders([...byId.values()]);
+        }),
+    );
+  }, []);
+
   const receivedOrders = todayOrders.filter((o) => o.is_received).length;
   const pendingOrders = todayOrders.filter((o) => !o.is_received).length;
   const lowStockDishes = dishes.filter((d) => d.stock_quantity < 5).length;
@@ -81,6 +81,13 @@ const MenuPage = () => {
     fetchDishes();
   };
 
+  const handleCartOrder = async (items) => {
+    const result = await studentApi.createCartOrder(items);
+    await refreshUser();
+    fetchDishes();
+    return result;
+  };
+
   const openReviewModal = async (dish) => {
     setSelectedDish(dish);
     try {
@@ -246,6 +253,7 @@ const MenuPage = () => {
           dishes={dishes}
           balance={user?.balance || 0}
           onBulkOrder={handleBulkOrder}
+          onCartOrder={handleCartOrder}
           user={user}
         />
       ) : (
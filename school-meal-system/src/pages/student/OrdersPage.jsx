@@ -27,8 +27,11 @@ const OrdersPage = () => {
 
   const fetchOrders = async () => {
     try {
-      const data = await studentApi.getMyOrders();
-      const sortedData = data.sort((a, b) => {
+      const [ordersData, upcomingData] = await Promise.all([
+        studentApi.getMyOrders(),
+        studentApi.getUpcomingOrders(),
+      ]);
+      const sortedData = [...upcomingData, ...ordersData].sort((a, b) => {
         const dateA = a.order_date
           ? new Date(a.order_date)
           : new Date(a.created_at);
@@ -228,7 +231,10 @@ const OrdersPage = () => {
                               <div className="space-y-2">
                                 {orders.map((order) => (
                                   <div
-                                    key={order.id}
+                                    key={
+                                      order.id ??
+                                      `planned-${order.subscription_id}-${order.service_date}`
+                                    }
                                     className="flex flex-col sm:flex-row sm:items-center justify-between gap-2 p-3 rounded-lg bg-base-100"
                                   >
                                     <div className="flex items-center gap-3">
@@ -254,12 +260,14 @@ const OrdersPage = () => {
                                           >
                                             {order.is_received
                                               ? "Получено"
-                                              : "Ожидает"}
+                                              : order.is_planned
+                                                ? "Запланировано"
+                                                : "Ожидает"}
                                           </span>
                                         </div>
                                       </div>
                                     </div>
-                                    {!order.is_received && (
+                                    {!order.is_received && !order.is_planned && (
                                       <button
                                         className="btn btn-success btn-sm"
                                         onClick={() => handleReceive(order.id)}